@@ -0,0 +1,81 @@
+"""Compare peak RSS and time of the memory-mapped large-file path against a plain read.
+
+Each measurement runs in a fresh subprocess so ru_maxrss reflects that run only:
+
+    python benchmarks/bench_large_files.py --sizes 100 250 500 1000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import make_settings
+
+
+def max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def run_worker(mode, path):
+    if mode == "read":
+        # The pre-mmap implementation: full text-mode read, str.count, then string concatenation
+        started = time.perf_counter()
+        with open(path, "r", encoding="utf-8") as file:
+            content = file.read()
+        line_count = content.count("\n") + 1
+        bundle = ""
+        bundle += f"File: {os.path.basename(path)}\n"
+        bundle += f"Path: {path}\n"
+        bundle += content
+        bundle += "\n\n"
+    else:
+        from processing import process_path
+
+        settings = make_settings(tempfile.mkdtemp(prefix="clipminder-bench-"), max_file_size=4000,
+                                 max_output_size=0, process_all_files=True)
+        started = time.perf_counter()
+        bundle, _, line_count, _ = process_path(path, settings)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"mode": mode, "seconds": round(elapsed, 3), "peak_rss_mb": round(max_rss_mb(), 1),
+                      "lines": line_count, "chars": len(bundle)}))
+
+
+def make_file(path, size_mb):
+    line = "2024-01-01T00:00:00Z INFO request handled path=/api/items status=200 duration_ms=12\n"
+    block = line * (1024 * 1024 // len(line) + 1)
+    block = block[:1024 * 1024]
+    with open(path, "w") as file:
+        for _ in range(size_mb):
+            file.write(block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 250, 500, 1000], help="file sizes in MB")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size_mb in args.sizes:
+            path = os.path.join(work_dir, f"large_{size_mb}mb.log")
+            make_file(path, size_mb)
+            for mode in ("read", "mmap"):
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", mode, path],
+                                        capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"size={size_mb}MB mode={mode} time={result['seconds']}s "
+                      f"peak_rss={result['peak_rss_mb']}MB lines={result['lines']}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
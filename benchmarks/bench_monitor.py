@@ -0,0 +1,100 @@
+"""Compare clipboard detection modes: wakeups per hour and copy-to-result latency.
+
+Runs headless on the offscreen Qt platform:
+
+    python benchmarks/bench_monitor.py --copies 10 --idle 3
+
+The copies are made from this process, so every change is one Qt notifies about. On macOS, changes made by other
+apps are only notified while the app is active, which this benchmark cannot show; there, event-mode latency is
+really the fallback poll interval.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from PyQt6.QtCore import QEventLoop, QMimeData, QTimer, QUrl  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+
+from ClipboardMonitorThread import ClipboardMonitorThread  # noqa: E402
+from DatabaseManager import DatabaseManager  # noqa: E402
+from Settings import Settings  # noqa: E402
+
+
+def wait_for(predicate, timeout):
+    loop = QEventLoop()
+    deadline = time.monotonic() + timeout
+    timer = QTimer()
+    timer.timeout.connect(lambda: (predicate() or time.monotonic() > deadline) and loop.quit())
+    timer.start(5)
+    loop.exec()
+    timer.stop()
+    return predicate()
+
+
+def idle(seconds):
+    loop = QEventLoop()
+    QTimer.singleShot(int(seconds * 1000), loop.quit)
+    loop.exec()
+
+
+def run_mode(mode, settings, db_manager, work_dir, copies, idle_seconds):
+    settings.monitor_mode = mode
+    clipboard = QApplication.clipboard()
+    clipboard.setText("")
+    completed = []
+    thread = ClipboardMonitorThread(settings, db_manager)
+    thread.copy_completed.connect(lambda *args: completed.append(time.perf_counter()))
+    thread.start()
+
+    latencies = []
+    started = time.monotonic()
+    for i in range(copies):
+        path = os.path.join(work_dir, f"{mode}_{i}.txt")
+        with open(path, "w") as file:
+            file.write(f"copy {i}\n")
+        mime_data = QMimeData()
+        mime_data.setUrls([QUrl.fromLocalFile(path)])
+        expected = len(completed) + 1
+        copied_at = time.perf_counter()
+        clipboard.setMimeData(mime_data)
+        if wait_for(lambda: len(completed) >= expected, timeout=10):
+            latencies.append(completed[-1] - copied_at)
+        idle(idle_seconds)
+    elapsed = time.monotonic() - started
+
+    thread.stop()
+    thread.wait()
+    latencies.sort()
+    return {
+        "mode": mode,
+        "copies": copies,
+        "completed": len(latencies),
+        "wakeups_per_hour": round(thread.wakeups / elapsed * 3600),
+        "latency_mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+        "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=10)
+    parser.add_argument("--idle", type=float, default=3.0, help="seconds between copies")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)  # noqa: F841
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_manager = DatabaseManager(os.path.join(work_dir, "clipboard_monitor.db"))
+        settings = Settings(db_manager)
+        for mode in ("poll", "event"):
+            result = run_mode(mode, settings, db_manager, work_dir, args.copies, args.idle)
+            print(", ".join(f"{key}={value}" for key, value in result.items()))
+        db_manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Measure process_path throughput (files/s, MB/s) for different reader worker counts.
+
+    python benchmarks/bench_process_path.py --files 10000 --workers 1 4 8 16
+    sudo python benchmarks/bench_process_path.py --drop-caches   # cold page cache, Linux only
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import make_settings, make_tree
+
+from processing import process_path  # noqa: E402
+
+
+def drop_page_cache():
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as control:
+        control.write("3\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tree", help="benchmark an existing directory instead of a synthetic tree")
+    parser.add_argument("--drop-caches", action="store_true",
+                        help="drop the page cache before every run so reads hit storage (Linux, needs root)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        root = args.tree
+        if root is None:
+            root = f"{work_dir}/tree"
+            make_tree(root, args.files)
+        settings = make_settings(work_dir, process_all_files=True, max_file_size=1000)
+
+        for workers in args.workers:
+            settings.read_workers = workers
+            best = None
+            for _ in range(args.repeat):
+                if args.drop_caches:
+                    drop_page_cache()
+                started = time.perf_counter()
+                content, files_count, _, _ = process_path(root, settings)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            megabytes = len(content.encode("utf-8")) / 1024 / 1024
+            print(f"workers={workers} files={files_count} time={best:.3f}s "
+                  f"files/s={files_count / best:.0f} MB/s={megabytes / best:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Measure launch-to-tray-visible time of the application, with summarization disabled and enabled.
+
+Each run starts src/main.py in a fresh process on the offscreen Qt platform and exits right after startup.
+Whether Ollama is running or not must not change the result, since model discovery runs in the background:
+
+    python benchmarks/bench_startup.py --runs 5 --max-ms 1500
+
+Exits non-zero when a median exceeds --max-ms, or when requests got imported with summarization disabled.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import SRC_DIR
+from DatabaseManager import DatabaseManager
+
+
+def run_once(db_path):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    output = subprocess.run([sys.executable, os.path.join(SRC_DIR, "main.py"), "--db", db_path,
+                             "--quit-after-startup"], capture_output=True, text=True, env=env, timeout=60).stdout
+    line = next(line for line in output.splitlines() if line.startswith("startup_ms="))
+    fields = dict(field.split("=") for field in line.split())
+    return float(fields["startup_ms"]), fields["requests_imported"] == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="fail when the median startup time exceeds this")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as work_dir:
+        for use_ollama in (False, True):
+            db_path = os.path.join(work_dir, f"ollama_{use_ollama}.db")
+            db_manager = DatabaseManager(db_path)
+            db_manager.set_settings({"use_ollama": str(use_ollama)})
+            db_manager.close()
+
+            run_once(db_path)  # warm-up: disk cache, and schema migrations on first start
+            times = []
+            requests_imported = False
+            for _ in range(args.runs):
+                elapsed_ms, imported = run_once(db_path)
+                times.append(elapsed_ms)
+                requests_imported |= imported
+
+            median = statistics.median(times)
+            print(f"use_ollama={use_ollama} runs={len(times)} median_ms={median:.1f} min_ms={min(times):.1f} "
+                  f"max_ms={max(times):.1f} requests_imported={requests_imported}")
+            failed |= not use_ollama and requests_imported
+            failed |= args.max_ms is not None and median > args.max_ms
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Run the benchmark suite and write machine-readable results for comparison across commits.
+
+Covers bundle throughput and peak memory on synthetic trees, history insert/read latency, history menu
+refresh time and summarization against a stub Ollama server. Runs headless on the offscreen Qt platform:
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --output after.json --scale 0.2 --only bundle history
+    python benchmarks/compare.py before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import PROFILES, SRC_DIR, make_profile_tree, make_settings
+
+SCENARIOS = ("bundle", "history", "menu", "summarize")
+
+
+def max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def add_latencies(metrics, name, latencies_ms):
+    metrics[f"{name}_p50_ms"] = round(percentile(latencies_ms, 0.5), 3)
+    metrics[f"{name}_p95_ms"] = round(percentile(latencies_ms, 0.95), 3)
+
+
+def run_bundle_worker(path):
+    # One process_path run in a fresh process, so peak RSS belongs to this run alone
+    from processing import process_path
+
+    settings = make_settings(tempfile.mkdtemp(prefix="clipminder-bench-"), process_all_files=True,
+                             max_file_size=64, max_output_size=0)
+    started = time.perf_counter()
+    content, files_count, lines_count, _ = process_path(path, settings)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"seconds": elapsed, "files": files_count, "chars": len(content),
+                      "peak_rss_mb": max_rss_mb()}))
+
+
+def bench_bundle(work_dir, scale, repeat):
+    metrics = {}
+    for profile in PROFILES:
+        root = os.path.join(work_dir, profile)
+        files, total_bytes = make_profile_tree(root, profile, scale)
+        runs = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--bundle-worker", root],
+                                    capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        best = min(runs, key=lambda run: run["seconds"])
+        metrics[f"bundle.{profile}.seconds"] = round(best["seconds"], 4)
+        metrics[f"bundle.{profile}.files_per_s"] = round(files / best["seconds"], 1)
+        metrics[f"bundle.{profile}.mb_per_s"] = round(total_bytes / 1024 / 1024 / best["seconds"], 2)
+        metrics[f"bundle.{profile}.peak_rss_mb"] = round(max(run["peak_rss_mb"] for run in runs), 1)
+    return metrics
+
+
+def make_bundle(index, size):
+    header = f"File: module{index}.py\nPath: /bench/module{index}.py\n"
+    line = f"def function_{index}(value):\n    return value * {index}\n"
+    return header + (line * (size // len(line) + 1))[:size] + "\n\n"
+
+
+def fill_history(db_manager, items, size):
+    latencies = []
+    for i in range(items):
+        elapsed, _ = timed(db_manager.add_copy_history, 1, size // 40, make_bundle(i, size), [f"module{i}.py"])
+        latencies.append(elapsed)
+    return latencies
+
+
+def bench_history(work_dir, scale):
+    from DatabaseManager import DatabaseManager
+
+    metrics = {}
+    db_manager = DatabaseManager(os.path.join(work_dir, "history.db"))
+    small_items = max(int(500 * scale), 20)
+    large_items = max(int(20 * scale), 3)
+    add_latencies(metrics, "history.insert_64k", fill_history(db_manager, small_items, 64 * 1024))
+    add_latencies(metrics, "history.insert_4m", fill_history(db_manager, large_items, 4 * 1024 * 1024))
+
+    newest = db_manager.get_copy_history(1)[0][0]
+    add_latencies(metrics, "history.list", [timed(db_manager.get_copy_history)[0] for _ in range(100)])
+    add_latencies(metrics, "history.read_4m",
+                  [timed(db_manager.get_history_item_content, newest - i % large_items)[0] for i in range(20)])
+    if db_manager.search_available:
+        deadline = time.monotonic() + 120
+        while db_manager.indexer.thread is not None and time.monotonic() < deadline:
+            time.sleep(0.05)  # the index is filled in the background
+        add_latencies(metrics, "history.search",
+                      [timed(db_manager.search_history, f"function_{i}")[0] for i in range(50)])
+    db_manager.close()
+    return metrics
+
+
+def get_application():
+    from PyQt6.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+
+def bench_menu(work_dir, scale):
+    from ClipboardMonitorApp import ClipboardMonitorApp
+    from DatabaseManager import DatabaseManager
+
+    get_application()
+    db_path = os.path.join(work_dir, "menu.db")
+    db_manager = DatabaseManager(db_path)
+    fill_history(db_manager, max(int(200 * scale), 30), 16 * 1024)
+    db_manager.close()
+
+    app = ClipboardMonitorApp(db_path)
+    latencies = [timed(app.update_history_menu)[0] for _ in range(50)]
+    app.quit_app()
+    metrics = {}
+    add_latencies(metrics, "menu.refresh", latencies)
+    return metrics
+
+
+def bench_summarize(work_dir, scale, first_token_ms, token_ms, failure_rate):
+    import utils
+    from DatabaseManager import DatabaseManager
+    from SummarizationScheduler import SummarizationScheduler
+    from stub_ollama import StubOllamaServer
+
+    application = get_application()
+    server = StubOllamaServer(first_token_ms=first_token_ms, token_ms=token_ms, failure_rate=failure_rate).start()
+    utils.OLLAMA_URL = server.url
+    db_manager = DatabaseManager(os.path.join(work_dir, "summarize.db"))
+    items = max(int(40 * scale), 8)
+    # Alternate small and large bundles: prompt size and latency should not depend on bundle size
+    item_ids = [db_manager.add_copy_history(1, 1, make_bundle(i, (16 if i % 2 else 4096) * 1024))
+                for i in range(items)]
+
+    results = {}
+    scheduler = SummarizationScheduler(db_manager, workers=2)
+    scheduler.summary_ready.connect(lambda item_id, summary: results.setdefault(item_id, summary))
+    started = time.perf_counter()
+    for item_id in item_ids:
+        scheduler.submit(item_id, "stub:latest")
+    deadline = time.monotonic() + 120
+    while len(results) < items and time.monotonic() < deadline:
+        application.processEvents()
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    stats = scheduler.stats()
+    scheduler.shutdown()
+    db_manager.close()
+    server.stop()
+
+    errors = sum(summary.startswith("Error") for summary in results.values())
+    return {
+        "summarize.jobs_per_s": round(len(results) / elapsed, 2),
+        "summarize.run_mean_ms": round(stats["run_mean"] * 1000, 1),
+        "summarize.run_p95_ms": round(stats["run_p95"] * 1000, 1),
+        "summarize.wait_p95_ms": round(stats["wait_p95"] * 1000, 1),
+        "summarize.prompt_chars_max": max(server.prompt_chars),
+        "summarize.errors": errors,
+    }
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                  cwd=SRC_DIR).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                    text=True, check=True, cwd=SRC_DIR).stdout.strip())
+        return revision, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies tree sizes and item counts")
+    parser.add_argument("--repeat", type=int, default=3, help="bundle runs per profile; the best is kept")
+    parser.add_argument("--first-token-ms", type=float, default=100, help="stub Ollama time to first token")
+    parser.add_argument("--token-ms", type=float, default=10, help="stub Ollama time per token")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of stub generations that fail")
+    parser.add_argument("--bundle-worker", metavar="PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.bundle_worker:
+        run_bundle_worker(args.bundle_worker)
+        return
+
+    revision, dirty = git_revision()
+    metrics = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scenario in args.only:
+            started = time.perf_counter()
+            if scenario == "bundle":
+                metrics.update(bench_bundle(work_dir, args.scale, args.repeat))
+            elif scenario == "history":
+                metrics.update(bench_history(work_dir, args.scale))
+            elif scenario == "menu":
+                metrics.update(bench_menu(work_dir, args.scale))
+            else:
+                metrics.update(bench_summarize(work_dir, args.scale, args.first_token_ms, args.token_ms,
+                                               args.failure_rate))
+            print(f"{scenario}: done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    results = {
+        "meta": {
+            "revision": revision,
+            "dirty": dirty,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale": args.scale,
+            "stub_ollama": {"first_token_ms": args.first_token_ms, "token_ms": args.token_ms,
+                            "failure_rate": args.failure_rate},
+        },
+        "metrics": metrics,
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+    for name, value in sorted(metrics.items()):
+        print(f"{name} = {value}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import os
+import random
+import sys
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+
+def make_tree(root, files, dirs_per_level=8, depth=3, min_size=512, max_size=16 * 1024, seed=0):
+    rng = random.Random(seed)
+    directories = [root]
+    frontier = [root]
+    for _ in range(depth):
+        next_frontier = []
+        for parent in frontier:
+            for i in range(dirs_per_level):
+                path = os.path.join(parent, f"dir{i}")
+                os.makedirs(path, exist_ok=True)
+                next_frontier.append(path)
+        directories.extend(next_frontier)
+        frontier = next_frontier
+
+    total_bytes = 0
+    line = "The quick brown fox jumps over the lazy dog 0123456789\n"
+    for i in range(files):
+        size = rng.randint(min_size, max_size)
+        path = os.path.join(directories[i % len(directories)], f"file{i}.txt")
+        with open(path, "w") as file:
+            file.write((line * (size // len(line) + 1))[:size])
+        total_bytes += size
+    return total_bytes
+
+
+def make_settings(work_dir=None, **overrides):
+    from DatabaseManager import DatabaseManager
+    from Settings import Settings
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="clipminder-bench-")
+    settings = Settings(DatabaseManager(os.path.join(work_dir, "clipboard_monitor.db")))
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    return settings
+
+
+PROFILES = ("small_files", "huge_files", "deep_nesting", "mixed_binary")
+
+
+def write_text(path, size, rng, block_size=1024 * 1024):
+    # Code-like lines; files above block_size repeat one generated block to keep generation fast
+    words = ("def", "return", "self", "value", "import", "class", "for", "in", "if", "else", "None", "data")
+    lines = []
+    generated = 0
+    while generated < min(size, block_size):
+        line = " " * rng.choice((0, 4, 8)) + " ".join(rng.choice(words) for _ in range(rng.randint(3, 12))) + "\n"
+        lines.append(line)
+        generated += len(line)
+    block = "".join(lines)
+    with open(path, "w") as file:
+        written = 0
+        while written < size:
+            chunk = block[:size - written]
+            file.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def make_profile_tree(root, profile, scale=1.0, seed=0):
+    # Deterministic synthetic trees for the benchmark suite; returns (files, bytes) written
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    files = 0
+    total_bytes = 0
+    if profile == "small_files":
+        count = int(5000 * scale)
+        directories = [root]
+        for i in range(max(count // 50, 1)):
+            directories.append(os.path.join(rng.choice(directories), f"pkg{i}"))
+            os.makedirs(directories[-1], exist_ok=True)
+        for i in range(count):
+            total_bytes += write_text(os.path.join(rng.choice(directories), f"module{i}.py"),
+                                      rng.randint(200, 4096), rng)
+            files += 1
+    elif profile == "huge_files":
+        # Large enough for the memory-mapped path, plus a handful of ordinary files next to them
+        for i in range(max(int(3 * scale), 1)):
+            total_bytes += write_text(os.path.join(root, f"huge{i}.log"), 24 * 1024 * 1024, rng)
+            files += 1
+        for i in range(20):
+            total_bytes += write_text(os.path.join(root, f"notes{i}.md"), rng.randint(1024, 8192), rng)
+            files += 1
+    elif profile == "deep_nesting":
+        directory = root
+        for depth in range(int(60 * scale) or 1):
+            directory = os.path.join(directory, f"level{depth}")
+            os.makedirs(directory, exist_ok=True)
+            for i in range(8):
+                total_bytes += write_text(os.path.join(directory, f"file{i}.txt"), rng.randint(256, 2048), rng)
+                files += 1
+    elif profile == "mixed_binary":
+        count = int(2000 * scale)
+        for i in range(count):
+            directory = os.path.join(root, f"dir{i % 20}")
+            os.makedirs(directory, exist_ok=True)
+            kind = i % 10
+            if kind < 3:
+                # Binary content under binary, text-looking and missing extensions
+                name = (f"image{i}.png", f"data{i}.txt", f"blob{i}")[kind]
+                data = bytes(rng.getrandbits(8) for _ in range(rng.randint(512, 16384)))
+                with open(os.path.join(directory, name), "wb") as file:
+                    file.write(b"\x00" + data)
+                total_bytes += len(data) + 1
+            else:
+                total_bytes += write_text(os.path.join(directory, f"source{i}.py"), rng.randint(256, 8192), rng)
+            files += 1
+    else:
+        raise ValueError(f"Unknown profile: {profile}")
+    return files, total_bytes
@@ -0,0 +1,62 @@
+"""Compare two bench_suite.py result files and flag regressions.
+
+    python benchmarks/compare.py before.json after.json --threshold 10
+
+Metrics ending in _per_s are better when higher; every other metric is better when lower.
+Exits non-zero when any metric regressed by more than the threshold (in percent).
+"""
+import argparse
+import json
+import sys
+
+
+def higher_is_better(name):
+    return name.endswith("_per_s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.candidate) as file:
+        candidate = json.load(file)
+    for label, results in (("baseline", baseline), ("candidate", candidate)):
+        meta = results["meta"]
+        print(f"{label}: {meta['revision'] or 'unknown'}{' (dirty)' if meta['dirty'] else ''} "
+              f"scale={meta['scale']} python={meta['python']}")
+    if baseline["meta"]["scale"] != candidate["meta"]["scale"]:
+        print("warning: results were produced with different --scale values")
+
+    regressions = 0
+    names = sorted(set(baseline["metrics"]) | set(candidate["metrics"]))
+    width = max(len(name) for name in names) if names else 0
+    for name in names:
+        before = baseline["metrics"].get(name)
+        after = candidate["metrics"].get(name)
+        if before is None or after is None:
+            print(f"{name:<{width}}  {before!s:>12}  {after!s:>12}  (only in one file)")
+            continue
+        if before == 0:
+            change = 0.0 if after == 0 else float("inf")
+        else:
+            change = (after - before) / abs(before) * 100
+        worse = -change if higher_is_better(name) else change
+        verdict = ""
+        if worse > args.threshold:
+            verdict = "REGRESSION"
+            regressions += 1
+        elif worse < -args.threshold:
+            verdict = "improved"
+        print(f"{name:<{width}}  {before:>12}  {after:>12}  {change:+8.1f}%  {verdict}")
+
+    print(f"{regressions} regression(s) beyond {args.threshold:.0f}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
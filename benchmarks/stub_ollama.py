@@ -0,0 +1,126 @@
+"""Minimal stand-in for the Ollama HTTP API, for benchmarking summarization without a model.
+
+Serves /api/tags, /api/show and streaming /api/generate. Latency and failures are configurable:
+
+    python benchmarks/stub_ollama.py --port 11500 --first-token-ms 200 --token-ms 20 --failure-rate 0.1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TITLE_TOKENS = ["Synthetic", " benchmark", " bundle", " title", "\n", "\n", "This", " title", " summarises"]
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, first_token_ms=100, token_ms=10, failure_rate=0.0, context_length=4096, seed=0):
+        super().__init__(("127.0.0.1", port), StubOllamaHandler)
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.failure_rate = failure_rate
+        self.context_length = context_length
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.prompt_chars = []
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="stub-ollama", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            failed = self.rng.random() < self.failure_rate
+            self.failures += failed
+            return failed
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Ollama
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_json({"models": [{"name": "stub:latest"}, {"name": "stub-large:latest"}]})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        request = self.read_json()
+        server = self.server
+        if self.path == "/api/show":
+            self.send_json({"parameters": "", "model_info": {"stub.context_length": server.context_length}})
+            return
+        if self.path != "/api/generate":
+            self.send_json({"error": "not found"}, 404)
+            return
+        with server.lock:
+            server.prompt_chars.append(len(request.get("prompt", "")))
+        if server.should_fail():
+            self.send_json({"error": "stub failure"}, 500)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(server.first_token_ms / 1000)
+        try:
+            for token in TITLE_TOKENS:
+                self.write_chunk(json.dumps({"response": token, "done": False}) + "\n")
+                time.sleep(server.token_ms / 1000)
+            self.write_chunk(json.dumps({"response": "", "done": True}) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # client stopped reading after the title line
+
+    def write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--first-token-ms", type=float, default=100)
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = StubOllamaServer(args.port, args.first_token_ms, args.token_ms, args.failure_rate)
+    print(f"Stub Ollama listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,40 @@
+import os
 from PyQt6.QtGui import QIcon, QAction
-from PyQt6.QtWidgets import (QWidget, QSystemTrayIcon, QMenu, QDialog, QApplication)
+from PyQt6.QtWidgets import (QWidget, QSystemTrayIcon, QMenu, QDialog, QApplication, QFileDialog)
 from ClipboardMonitorThread import ClipboardMonitorThread
 from DatabaseManager import DatabaseManager
+from FileContentCache import FileContentCache
+from HistorySearchDialog import HistorySearchDialog
+from Instrumentation import instrumentation
+from ModelDiscovery import ModelDiscovery
+from PinnedFolderManager import PinnedFolderManager
 from Settings import Settings
 from SettingsDialog import SettingsDialog
-from SummarizationThread import SummarizationThread
-from utils import set_clipboard_content
+from StatsDialog import StatsDialog
+from SummarizationScheduler import SummarizationScheduler
+from utils import LAZY_CLIPBOARD_THRESHOLD, set_clipboard_content, set_clipboard_history_item, set_clipboard_lazy
 
 
 class ClipboardMonitorApp(QWidget):
-    def __init__(self):
+    def __init__(self, db_path=None):
         super().__init__()
-        self.db_manager = DatabaseManager()
+        self.db_manager = DatabaseManager(db_path)
+        instrumentation.profile_dir = os.path.join(os.path.dirname(self.db_manager.db_path), "profiles")
         self.settings = Settings(self.db_manager)
+        self.file_cache = FileContentCache(self.db_manager, self.settings.file_cache_size * 1024 * 1024,
+                                           self.settings.use_disk_cache, self.settings.disk_cache_size * 1024 * 1024)
+        self.pinned_folders = PinnedFolderManager(self.settings, self.file_cache)
+        self.summarizer = None
+        self.start_summarizer()
+        self.model_discovery = ModelDiscovery()
+        self.model_discovery.models_ready.connect(self.on_models_discovered)
+        self.apply_history_retention()
         self.init_ui()
         self.monitor_thread = None
-        self.summarization_threads = []
+        self.processing_status = None
         self.start_monitoring()  # Start monitoring on app launch
+        if self.settings.use_ollama:
+            self.model_discovery.start()
 
     def init_ui(self):
         self.tray_icon = QSystemTrayIcon(self)
@@ -27,13 +45,35 @@ class ClipboardMonitorApp(QWidget):
         self.toggle_action.triggered.connect(self.toggle_monitoring)
         self.menu.addAction(self.toggle_action)
 
+        self.cancel_action = QAction("Cancel Processing", self)
+        self.cancel_action.triggered.connect(self.cancel_processing)
+        self.cancel_action.setVisible(False)
+        self.menu.addAction(self.cancel_action)
+
+        self.full_copy_action = QAction("Copy Full Bundle", self)
+        self.full_copy_action.triggered.connect(self.copy_full_bundle)
+        self.full_copy_action.setVisible(self.settings.delta_copies)
+        self.menu.addAction(self.full_copy_action)
+
         self.menu.addSeparator()
 
         self.history_menu = self.menu.addMenu("Copy History")
         self.update_history_menu()
 
+        if self.db_manager.search_available:
+            self.search_action = QAction("Search History...", self)
+            self.search_action.triggered.connect(self.show_history_search)
+            self.menu.addAction(self.search_action)
+
+        self.pinned_menu = self.menu.addMenu("Pinned Folders")
+        self.update_pinned_menu()
+
         self.menu.addSeparator()
 
+        self.stats_action = QAction("Stats", self)
+        self.stats_action.triggered.connect(self.show_stats)
+        self.menu.addAction(self.stats_action)
+
         self.settings_action = QAction("Settings", self)
         self.settings_action.triggered.connect(self.show_settings)
         self.menu.addAction(self.settings_action)
@@ -62,12 +102,16 @@ class ClipboardMonitorApp(QWidget):
 
     def start_monitoring(self):
         if self.monitor_thread is None or not self.monitor_thread.isRunning():
-            self.monitor_thread = ClipboardMonitorThread(self.settings, self.db_manager)
+            self.monitor_thread = ClipboardMonitorThread(self.settings, self.db_manager, self.file_cache,
+                                                         self.pinned_folders)
             self.monitor_thread.update_status.connect(self.update_status)
             self.monitor_thread.copy_completed.connect(self.add_to_history)
+            self.monitor_thread.lazy_clipboard_requested.connect(self.set_clipboard_from_history)
+            self.monitor_thread.progress.connect(self.on_processing_progress)
+            self.monitor_thread.processing_changed.connect(self.on_processing_changed)
             self.monitor_thread.start()
             self.toggle_action.setText("Stop Monitoring")
-            self.tray_icon.setToolTip("Clipboard Monitor: Running")
+            self.update_tooltip()
             self.set_icon(is_active=True)
 
     def stop_monitoring(self):
@@ -75,17 +119,50 @@ class ClipboardMonitorApp(QWidget):
             self.monitor_thread.stop()
             self.monitor_thread.wait()
             self.monitor_thread = None
+        self.on_processing_changed(False)
         self.toggle_action.setText("Start Monitoring")
-        self.tray_icon.setToolTip("Clipboard Monitor: Stopped")
+        self.update_tooltip()
         self.set_icon(is_active=False)
 
+    def update_tooltip(self):
+        running = self.monitor_thread is not None and self.monitor_thread.isRunning()
+        tooltip = f"Clipboard Monitor: {'Running' if running else 'Stopped'}"
+        if self.processing_status:
+            tooltip += f"\n{self.processing_status}"
+        pending = self.summarizer.depth() if self.summarizer else 0
+        if pending:
+            stats = self.summarizer.stats()
+            tooltip += f"\n{pending} summary job(s) pending, last {stats['run_mean']:.1f}s average"
+        self.tray_icon.setToolTip(tooltip)
+
+    def on_processing_changed(self, processing):
+        self.cancel_action.setVisible(processing)
+        self.processing_status = "Processing..." if processing else None
+        self.update_tooltip()
+
+    def on_processing_progress(self, files_done, files_total, size, eta):
+        status = f"Processing: {files_done}" + (f" of {files_total}" if files_total >= 0 else "") + " file(s), "
+        status += f"{size / 1024 / 1024:.1f} MB"
+        if eta >= 0:
+            status += f", about {eta:.0f}s left"
+        self.processing_status = status
+        self.update_tooltip()
+
+    def copy_full_bundle(self):
+        if self.monitor_thread:
+            self.monitor_thread.request_full_copy()
+
+    def cancel_processing(self):
+        if self.monitor_thread:
+            self.monitor_thread.cancel_job()
+
     def update_status(self, message):
         self.tray_icon.showMessage("Clipboard Monitor", message, QSystemTrayIcon.MessageIcon.Information, 3000)
 
-    def add_to_history(self, files, lines, item_id, content, file_paths):
+    def add_to_history(self, files, lines, item_id, file_paths):
         self.update_history_menu()
         if self.settings.use_ollama:
-            self.start_summarization(item_id, content)
+            self.start_summarization(item_id)
         else:
             self.update_summary(item_id, "Summarization disabled")
 
@@ -96,13 +173,17 @@ class ClipboardMonitorApp(QWidget):
         self.update_history_menu()
 
     def update_history_menu(self):
+        with instrumentation.measure("menu.refresh"):
+            self.fill_history_menu()
+
+    def fill_history_menu(self):
         self.history_menu.clear()
         history = self.db_manager.get_copy_history()
         if not history:
             self.history_menu.addAction("No recent copies").setEnabled(False)
         else:
             for item in history:
-                item_id, files_count, lines_count, content, summary = item
+                item_id, files_count, lines_count, summary = item
                 action_text = f"{files_count} file(s), {lines_count} line(s)"
                 if summary and not summary.startswith("Error:"):
                     action_text += f" - {summary}"
@@ -110,36 +191,100 @@ class ClipboardMonitorApp(QWidget):
                 action.triggered.connect(lambda checked, item_id=item_id: self.copy_history_item(item_id))
                 self.history_menu.addAction(action)
 
-    def start_summarization(self, item_id, content):
-        summary_thread = SummarizationThread(item_id, content, self.settings.ollama_model)
-        summary_thread.summary_ready.connect(self.update_summary)
-        summary_thread.finished.connect(lambda: self.cleanup_thread(summary_thread))
-        self.summarization_threads.append(summary_thread)
-        summary_thread.start()
+    def update_pinned_menu(self):
+        self.pinned_menu.clear()
+        pin_action = QAction("Pin Folder...", self)
+        pin_action.triggered.connect(self.pin_folder)
+        self.pinned_menu.addAction(pin_action)
+        roots = self.pinned_folders.roots()
+        if roots:
+            self.pinned_menu.addSeparator()
+        for root in roots:
+            folder_menu = self.pinned_menu.addMenu(os.path.basename(root) or root)
+            folder_menu.setToolTip(root)
+            copy_action = QAction("Copy Bundle", self)
+            copy_action.triggered.connect(lambda checked, root=root: self.copy_pinned_folder(root))
+            folder_menu.addAction(copy_action)
+            unpin_action = QAction("Unpin", self)
+            unpin_action.triggered.connect(lambda checked, root=root: self.unpin_folder(root))
+            folder_menu.addAction(unpin_action)
 
-    def cleanup_thread(self, thread):
-        if thread in self.summarization_threads:
-            self.summarization_threads.remove(thread)
-        thread.deleteLater()
+    def pin_folder(self):
+        path = QFileDialog.getExistingDirectory(None, "Pin Folder")
+        if path and self.pinned_folders.pin(path):
+            self.update_pinned_menu()
+            self.update_status(f"Pinned {path}")
 
-    def copy_history_item(self, item_id):
-        content = self.db_manager.get_history_item_content(item_id)
-        if content:
+    def unpin_folder(self, root):
+        self.pinned_folders.unpin(root)
+        self.update_pinned_menu()
+
+    def copy_pinned_folder(self, root):
+        bundle = self.pinned_folders.get_bundle(root)
+        if bundle is None:
+            self.update_status(f"{root} is still being indexed")
+            return
+        content = bundle[0]
+        if len(content) >= LAZY_CLIPBOARD_THRESHOLD:
+            set_clipboard_lazy(lambda: content)  # already in memory; spares the pasteboard its own copy
+        else:
             set_clipboard_content(content)
+        self.update_status(f"Copied pinned folder: {bundle[1]} file(s), {bundle[2]} line(s)")
+
+    def start_summarizer(self):
+        if self.summarizer is not None:
+            self.summarizer.shutdown()
+        self.summarizer = SummarizationScheduler(self.db_manager, self.settings.summary_workers)
+        self.summarizer.summary_ready.connect(self.update_summary)
+        self.summarizer.queue_changed.connect(self.on_summary_queue_changed)
+
+    def on_models_discovered(self, models):
+        if models != self.settings.installed_models:
+            self.settings.installed_models = models
+            self.settings.save_installed_models()
+
+    def on_summary_queue_changed(self, depth):
+        self.update_tooltip()
+
+    def start_summarization(self, item_id):
+        self.summarizer.submit(item_id, self.settings.ollama_model)
+
+    def copy_history_item(self, item_id):
+        if set_clipboard_history_item(self.db_manager, item_id):
             self.update_status("Copied historical content to clipboard")
 
+    def set_clipboard_from_history(self, item_id):
+        set_clipboard_history_item(self.db_manager, item_id)
+
+    def show_history_search(self):
+        HistorySearchDialog(self.db_manager, self.copy_history_item, self).exec()
+
+    def apply_history_retention(self):
+        self.db_manager.set_history_retention(self.settings.history_max_size * 1024 * 1024,
+                                              self.settings.history_max_age)
+
+    def show_stats(self):
+        StatsDialog(self).exec()
+
     def show_settings(self):
-        dialog = SettingsDialog(self.settings, self)
+        dialog = SettingsDialog(self.settings, self, self.file_cache, self.summarizer, self.model_discovery)
         result = dialog.exec()
         if result == QDialog.DialogCode.Accepted:
+            self.file_cache.resize(self.settings.file_cache_size * 1024 * 1024, self.settings.use_disk_cache,
+                                   self.settings.disk_cache_size * 1024 * 1024)
+            self.pinned_folders.rescan_all()
+            self.apply_history_retention()
+            self.full_copy_action.setVisible(self.settings.delta_copies)
+            if self.settings.summary_workers != len(self.summarizer.workers):
+                self.start_summarizer()
             if self.monitor_thread:
                 self.stop_monitoring()
                 self.start_monitoring()
 
     def quit_app(self):
         self.stop_monitoring()
-        for thread in self.summarization_threads:
-            thread.wait()
+        self.pinned_folders.shutdown()
+        self.summarizer.shutdown()
         self.db_manager.close()
         QApplication.instance().quit()
 
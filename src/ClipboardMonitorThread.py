@@ -1,52 +1,170 @@
+import threading
 import time
 from PyQt6.QtCore import QThread, pyqtSignal
-from utils import get_clipboard_files, process_path, set_clipboard_content
+from PyQt6.QtWidgets import QApplication
+from Instrumentation import instrumentation
+from ProcessingJob import JobCancelled, ProcessingJob
+from utils import LAZY_CLIPBOARD_THRESHOLD, get_clipboard_files, get_clipboard_fingerprint, set_clipboard_content
+
+POLL_INTERVAL = 1  # seconds, used when monitor_mode is "poll"
+DEBOUNCE_DELAY = 0.15  # seconds of clipboard quiet time before handling a change
 
 
 class ClipboardMonitorThread(QThread):
     update_status = pyqtSignal(str)
-    copy_completed = pyqtSignal(int, int, int, str, list)  # files_count, lines_count, item_id, content, file_paths
+    copy_completed = pyqtSignal(int, int, int, list)  # files_count, lines_count, item_id, file_paths
+    progress = pyqtSignal(int, int, int, float)  # files done, files total (-1 while counting), chars, ETA (-1)
+    processing_changed = pyqtSignal(bool)
+    lazy_clipboard_requested = pyqtSignal(int)  # item_id of a large bundle to render from history on paste
 
-    def __init__(self, settings, db_manager):
+    def __init__(self, settings, db_manager, file_cache=None, pinned_folders=None):
         super().__init__()
         self.running = True
         self.settings = settings
         self.db_manager = db_manager
+        self.file_cache = file_cache
+        self.pinned_folders = pinned_folders
+        self.event_mode = self.settings.monitor_mode == "event"
+        self.clipboard_changed = threading.Event()
+        self.wakeups = 0
+        self.fingerprint = None
+        self.job = None
+        self.last_supersede_check = 0.0
+        self.last_copy_paths = []
+        self.full_copy_requested = threading.Event()
+        if self.event_mode:
+            # The thread object lives in the GUI thread, so the slot runs there and only flags the worker
+            QApplication.clipboard().dataChanged.connect(self.on_clipboard_changed)
+
+    def on_clipboard_changed(self):
+        self.clipboard_changed.set()
+
+    def wait_for_change(self):
+        # In event mode the fallback poll only catches notifications the platform failed to deliver
+        interval = self.settings.fallback_poll_interval if self.event_mode else POLL_INTERVAL
+        changed = self.clipboard_changed.wait(interval)
+        self.clipboard_changed.clear()
+        if changed:
+            # Debounce bursts of dataChanged (apps often set several formats one after another)
+            while self.running and self.clipboard_changed.wait(DEBOUNCE_DELAY):
+                self.clipboard_changed.clear()
+        self.wakeups += 1
 
     def run(self):
         last_processed_paths = []
         while self.running:
+            self.wait_for_change()
+            if not self.running:
+                break
             try:
-                file_paths = get_clipboard_files()
-
-                if file_paths and file_paths != last_processed_paths:
-                    self.update_status.emit(f"Processing {len(file_paths)} file(s)/folder(s)...")
-                    combined_content = ""
-                    total_processed_files = 0
-                    total_processed_lines = 0
-                    for path in file_paths:
-                        path_content, files_count, lines_count, _ = process_path(path, self.settings)
-                        if path_content:
-                            combined_content += path_content
-                            total_processed_files += files_count
-                            total_processed_lines += lines_count
-
-                    if combined_content:
-                        set_clipboard_content(combined_content)
-                        item_id = self.db_manager.add_copy_history(total_processed_files, total_processed_lines,
-                                                                   combined_content)
-                        self.update_status.emit(
-                            f"Processed {total_processed_files} file(s), {total_processed_lines} line(s)")
-                        self.copy_completed.emit(total_processed_files, total_processed_lines, item_id,
-                                                 combined_content, file_paths)
-                        last_processed_paths = file_paths
-                    else:
-                        self.update_status.emit(f"No supported files found in the copied path(s)")
-                        last_processed_paths = file_paths
+                if self.full_copy_requested.is_set():
+                    self.full_copy_requested.clear()
+                    if self.last_copy_paths:
+                        self.process_paths(self.last_copy_paths, full=True)
+                with instrumentation.measure("clipboard.fingerprint"):
+                    fingerprint = get_clipboard_fingerprint()
+                if fingerprint == self.fingerprint:
+                    continue
+                self.fingerprint = fingerprint
+
+                with instrumentation.measure("clipboard.read") as measurement:
+                    file_paths = get_clipboard_files()
+                    measurement.files = len(file_paths)
+                if not file_paths:
+                    # Clipboard moved on (e.g. to our own text output), so the same paths may be copied again
+                    last_processed_paths = []
+                elif file_paths != last_processed_paths:
+                    self.process_paths(file_paths)
+                    last_processed_paths = file_paths
             except Exception as e:
                 self.update_status.emit(f"Error: {str(e)}")
 
-            time.sleep(1)
+    def process_paths(self, file_paths, full=False):
+        with instrumentation.profile("copy"), instrumentation.measure("copy.total") as measurement:
+            self.build_and_store(file_paths, measurement, full)
+
+    def build_and_store(self, file_paths, measurement, full=False):
+        self.update_status.emit(f"Processing {len(file_paths)} file(s)/folder(s)...")
+        # Delta copies need the manifests of the "all" mode's complete walks; priority bundles are partial anyway
+        track_changes = self.settings.delta_copies and self.settings.assembly_mode != "priority"
+        job = ProcessingJob(file_paths, self.settings, self.file_cache, self.pinned_folders,
+                            self.settings.processing_timeout, self.report_progress, self.check_superseded,
+                            self.db_manager if track_changes else None, delta=not full)
+        self.job = job
+        self.processing_changed.emit(True)
+        try:
+            with instrumentation.measure("bundle.build") as build_measurement:
+                builder = job.run()
+                build_measurement.files = builder.files_count
+                build_measurement.size = builder.size
+        except JobCancelled as e:
+            self.update_status.emit(f"Processing {e} after {job.files_done} file(s)")
+            return
+        finally:
+            self.job = None
+            self.processing_changed.emit(False)
+
+        measurement.files = builder.files_count
+        measurement.size = builder.size
+        self.last_copy_paths = file_paths
+        if builder.files_count or job.base_id is not None:
+            lazy = builder.size >= LAZY_CLIPBOARD_THRESHOLD
+            if lazy:
+                # Never joined: history storage encodes the chunks one by one, and pasting reads them back from there
+                content = builder.chunks
+            else:
+                content = builder.getvalue()
+                set_clipboard_content(content)
+            item_id = self.db_manager.add_copy_history(builder.files_count, builder.lines_count, content,
+                                                       builder.file_names, job.base_id)
+            if lazy:
+                self.lazy_clipboard_requested.emit(item_id)
+            if job.manifests and not builder.truncated:
+                self.db_manager.set_copy_manifests(item_id, job.manifests)
+            status = f"Processed {builder.files_count} file(s), {builder.lines_count} line(s)"
+            if job.base_id is not None:
+                status = f"Processed {builder.files_count} changed file(s) since the last copy"
+            if builder.truncated:
+                status += " (stopped early: size or time limit reached)"
+            self.update_status.emit(status)
+            self.copy_completed.emit(builder.files_count, builder.lines_count, item_id, file_paths)
+        elif builder.truncated:
+            self.update_status.emit(f"Nothing copied: {builder.stop_reason}")
+        else:
+            self.update_status.emit(f"No supported files found in the copied path(s)")
+
+    def report_progress(self, job):
+        eta = job.eta()
+        self.progress.emit(job.files_done, job.files_total if job.counting_done else -1, job.builder.size,
+                           -1.0 if eta is None else eta)
+
+    def check_superseded(self, job):
+        # A different clipboard state replaces the running job; the main loop then picks it up
+        if self.event_mode:
+            if not self.clipboard_changed.is_set():
+                return
+        elif time.monotonic() - self.last_supersede_check < POLL_INTERVAL:
+            return
+        self.last_supersede_check = time.monotonic()
+        fingerprint = get_clipboard_fingerprint()
+        if fingerprint != self.fingerprint:
+            job.cancel("superseded by a new copy")
+        elif self.event_mode:
+            self.clipboard_changed.clear()  # same content announced again
+
+    def request_full_copy(self):
+        # Called from the GUI thread: bundles the last copied paths again in full, ignoring their manifests
+        self.full_copy_requested.set()
+        self.clipboard_changed.set()
+
+    def cancel_job(self):
+        job = self.job
+        if job is not None:
+            job.cancel()
 
     def stop(self):
         self.running = False
+        self.cancel_job()
+        if self.event_mode:
+            QApplication.clipboard().dataChanged.disconnect(self.on_clipboard_changed)
+        self.clipboard_changed.set()
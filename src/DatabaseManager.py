@@ -1,46 +1,439 @@
+import hashlib
+import json
+import os
+import re
+import shutil
 import sqlite3
-from queue import Queue
-from threading import Lock
+import sys
+import time
+import zlib
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Lock, Thread
+from Instrumentation import instrumentation
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DB_FILE_NAME = 'clipboard_monitor.db'
+READER_POOL_SIZE = 4
+WRITE_BATCH_SIZE = 256  # writes grouped into one commit when they queue up behind each other
+ZLIB_LEVEL = 1  # history bundles are large; favour compression speed, text still shrinks several times
+ZSTD_LEVEL = 3
+VACUUM_STEP_PAGES = 1024
+BLOB_READ_SIZE = 64 * 1024  # compressed bytes read at a time when only the head of a body is needed
+HISTORY_MENU_SIZE = 20
+SEARCH_INDEX_MAX_CHARS = 8 * 1024 * 1024  # per history item; the head of huge bundles is indexed
+SEARCH_RESULTS_LIMIT = 50
+FTS_CONTENTLESS = sqlite3.sqlite_version_info >= (3, 43, 0)  # contentless_delete: an index without a text copy
+SNIPPET_SAMPLE_BYTES = 64 * 1024
+SNIPPET_CONTEXT_CHARS = 60
+SUMMARY_CACHE_MAX_ENTRIES = 10000
+COPY_MANIFESTS_MAX_ENTRIES = 1000  # folders remembered for delta copies, most recently copied first
+
+
+def default_db_path():
+    if os.environ.get('CLIPMINDER_DB'):
+        return os.path.abspath(os.path.expanduser(os.environ['CLIPMINDER_DB']))
+    if sys.platform == 'darwin':
+        data_dir = os.path.expanduser('~/Library/Application Support/ClipMinder')
+    else:
+        data_dir = os.path.join(os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share'), 'ClipMinder')
+    return os.path.join(data_dir, DB_FILE_NAME)
+
+
+def compress_content(data):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return 'zlib', zlib.compress(data, ZLIB_LEVEL)
+
+
+def hash_chunks(chunks):
+    # (SHA-256 hex digest, length) of the UTF-8 encoding of the joined chunks
+    hasher = hashlib.sha256()
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        hasher.update(data)
+        size += len(data)
+    return hasher.hexdigest(), size
+
+
+def compress_chunks(chunks, size):
+    # Same data as compress_content() on the UTF-8 encoding of the joined chunks, without joining them;
+    # size is the encoded length, recorded in the zstd frame so decompress_content() can size its output
+    if zstandard is not None:
+        codec, compressor = 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj(size=size)
+    else:
+        codec, compressor = 'zlib', zlib.compressobj(ZLIB_LEVEL)
+    compressed = bytearray()  # grown in place; joining a list of parts would hold the output twice
+    for chunk in chunks:
+        compressed += compressor.compress(chunk.encode('utf-8'))
+    compressed += compressor.flush()
+    return codec, compressed
+
+
+def decompress_content(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("History item is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    if codec == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+    return data.decode('utf-8')
+
+
+def decompress_prefix(codec, source, max_bytes):
+    # Decodes only the first max_bytes of a stored body, reading no more of the file-like source than that takes;
+    # a character cut at the end is dropped
+    data = b''
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("History item is zstd-compressed but the zstandard package is not installed")
+        with zstandard.ZstdDecompressor().stream_reader(source, read_size=BLOB_READ_SIZE) as reader:
+            while len(data) < max_bytes:
+                chunk = reader.read(max_bytes - len(data))
+                if not chunk:
+                    break
+                data += chunk
+    elif codec == 'zlib':
+        decompressor = zlib.decompressobj()
+        while len(data) < max_bytes:
+            chunk = source.read(BLOB_READ_SIZE)
+            if not chunk:
+                break
+            data += decompressor.decompress(chunk, max_bytes - len(data))
+    else:
+        data = source.read(max_bytes)
+    return data[:max_bytes].decode('utf-8', errors='ignore')
+
+
+def find_word_start(finder, text):
+    # Offset of the first finder match that starts a word, like an FTS5 prefix query matches tokens
+    for hit in finder.finditer(text):
+        before = text[hit.start() - 1] if hit.start() else ' '
+        if not (before.isalnum() or before == '_'):
+            return hit.start()
+    return None
+
+
+class CoalescingWorker:
+    # Runs target() on a background thread; requests made while it runs are coalesced into one more run
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self.lock = Lock()
+        self.requested = False
+        self.thread = None
+
+    def request(self):
+        with self.lock:
+            self.requested = True
+            if self.thread is None:
+                self.thread = Thread(target=self.run, name=self.name, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.requested:
+                    self.thread = None
+                    return
+                self.requested = False
+            try:
+                self.target()
+            except sqlite3.Error as e:
+                print(f"Error in {self.name}: {e}")
 
 
 class DatabaseManager:
-    def __init__(self):
-        self.db_path = 'clipboard_monitor.db'
-        self.connection_pool = Queue()
-        self.pool_lock = Lock()
-        self.create_tables()
+    # SQLite in WAL mode: a fixed pool of read-only connections, and one writer thread that owns the only
+    # write connection and groups queued writes into a single commit. Readers never wait behind the writer.
+    def __init__(self, db_path=None):
+        self.db_path = os.path.abspath(db_path) if db_path else default_db_path()
+        self.prepare_db_path()
+        self.history_max_bytes = 0
+        self.history_max_age_days = 0
+        self.pruner = CoalescingWorker(self.prune_history, "history-prune")
+        self.indexer = CoalescingWorker(self.index_pending_history, "history-index")
+
+        self.write_queue = Queue()
+        self.writer_thread = Thread(target=self.run_writer, args=(self.connect(),), name="db-writer", daemon=True)
+        self.writer_thread.start()
+        self.write(self.enable_incremental_vacuum, transactional=False)
+        self.search_available = self.write(self.create_tables)
+
+        self.connection_pool = Queue(maxsize=READER_POOL_SIZE)
+        for _ in range(READER_POOL_SIZE):
+            conn = self.connect()
+            conn.execute('PRAGMA query_only = ON')
+            self.connection_pool.put(conn)
+        if self.search_available:
+            self.indexer.request()  # rows written before the index existed, or before the last shutdown
+
+    def prepare_db_path(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        legacy_path = os.path.abspath(DB_FILE_NAME)
+        if not os.path.exists(self.db_path) and legacy_path != self.db_path and os.path.isfile(legacy_path):
+            # Earlier versions kept the database in the working directory
+            shutil.copy2(legacy_path, self.db_path)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')  # durable at checkpoints; WAL keeps the database consistent
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA cache_size = -16000')
+        conn.execute('PRAGMA mmap_size = 268435456')
+        return conn
 
     def get_connection(self):
-        with self.pool_lock:
-            if self.connection_pool.empty():
-                return sqlite3.connect(self.db_path, check_same_thread=False)
-            return self.connection_pool.get()
+        return self.connection_pool.get()
 
     def return_connection(self, conn):
         self.connection_pool.put(conn)
 
-    def create_tables(self):
-        conn = self.get_connection()
+    def write(self, job, wait=True, transactional=True):
+        # Queues job(conn) for the writer thread. Returns its result when waiting, else a Future.
+        future = Future()
+        self.write_queue.put((job, future, transactional))
+        if wait:
+            return future.result()
+        future.add_done_callback(self.report_write_error)
+        return future
+
+    @staticmethod
+    def report_write_error(future):
+        if future.exception() is not None:
+            print(f"Database write failed: {future.exception()}")
+
+    def run_writer(self, conn):
+        stopping = False
+        while not stopping:
+            batch = [self.write_queue.get()]
+            while batch[-1] is not None and len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self.write_queue.get_nowait())
+                except Empty:
+                    break
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+
+            group = []
+            for job in batch:
+                if job[2]:
+                    group.append(job)
+                    continue
+                self.commit_group(conn, group)
+                group = []
+                self.run_job(conn, job)
+            self.commit_group(conn, group)
+        conn.close()
+
+    @staticmethod
+    def run_job(conn, job):
+        fn, future, _ = job
         try:
-            with conn:
-                conn.execute('''
-                    CREATE TABLE IF NOT EXISTS settings (
-                        key TEXT PRIMARY KEY,
-                        value TEXT
-                    )
-                ''')
-                conn.execute('''
-                    CREATE TABLE IF NOT EXISTS copy_history (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        files_count INTEGER,
-                        lines_count INTEGER,
-                        content TEXT,
-                        summary TEXT
-                    )
-                ''')
-        finally:
-            self.return_connection(conn)
+            future.set_result(fn(conn))
+        except Exception as e:
+            future.set_exception(e)
+
+    @staticmethod
+    def commit_group(conn, group):
+        # One transaction per group; each job runs in a savepoint so a failing job does not undo the others
+        if not group:
+            return
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, future, _ in group:
+                conn.execute('SAVEPOINT job')
+                try:
+                    outcomes.append((future, fn(conn), None))
+                    conn.execute('RELEASE job')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO job')
+                    conn.execute('RELEASE job')
+                    outcomes.append((future, None, e))
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for _, future, _ in group:
+                future.set_exception(e)
+            return
+        instrumentation.record("db.commit", time.perf_counter() - started, size=len(group))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    @staticmethod
+    def enable_incremental_vacuum(conn):
+        # Before anything else is written: a new database is created with incremental auto-vacuum, and one from an
+        # earlier version is switched over by a single full VACUUM here rather than in the middle of a copy
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        if conn.execute('PRAGMA page_count').fetchone()[0]:
+            conn.execute('VACUUM')
+
+    @staticmethod
+    def create_tables(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS copy_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                files_count INTEGER,
+                lines_count INTEGER,
+                content TEXT,
+                summary TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS file_cache (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                content TEXT,
+                line_count INTEGER,
+                bytes INTEGER,
+                stored_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # History bodies are stored once per distinct content, and deleted with the last copy_history row using them.
+        # Databases from before that keep an unused refcount column.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS history_blobs (
+                hash TEXT PRIMARY KEY,
+                codec TEXT,
+                data BLOB,
+                size INTEGER,
+                stored_size INTEGER
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_history_blobs_size ON history_blobs (hash, stored_size)')
+        # Titles by content and model; outlives the history rows so re-copied content is summarized once
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                content_hash TEXT,
+                model TEXT,
+                summary TEXT,
+                seconds REAL,
+                hits INTEGER DEFAULT 0,
+                last_used DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (content_hash, model)
+            )
+        ''')
+        # File fingerprints of each copied path as of its last complete copy, for delta copies
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS copy_manifests (
+                root TEXT PRIMARY KEY,
+                item_id INTEGER,
+                codec TEXT,
+                data BLOB,
+                files INTEGER,
+                stored_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_copy_manifests_item ON copy_manifests (item_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_copy_manifests_stored ON copy_manifests (stored_at)')
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(copy_history)')]
+        if 'content_hash' not in columns:
+            conn.execute('ALTER TABLE copy_history ADD COLUMN content_hash TEXT')
+        if 'base_id' not in columns:
+            # Set on delta copies: the history item the content is a delta against
+            conn.execute('ALTER TABLE copy_history ADD COLUMN base_id INTEGER')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_copy_history_timestamp ON copy_history (timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_copy_history_content_hash ON copy_history (content_hash)')
+        # Reference counts lived in the blob rows, and updating one rewrote the whole compressed body
+        conn.execute('DROP TRIGGER IF EXISTS copy_history_add_ref')
+        conn.execute('DROP TRIGGER IF EXISTS copy_history_release_ref')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS copy_history_release_blob AFTER DELETE ON copy_history
+            WHEN OLD.content_hash IS NOT NULL
+            BEGIN
+                DELETE FROM history_blobs WHERE hash = OLD.content_hash
+                    AND NOT EXISTS (SELECT 1 FROM copy_history WHERE content_hash = OLD.content_hash);
+            END
+        ''')
+        # A manifest is only useful while the copy it describes is in history; the next copy is full again
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS copy_history_drop_manifests AFTER DELETE ON copy_history
+            BEGIN
+                DELETE FROM copy_manifests WHERE item_id = OLD.id;
+            END
+        ''')
+        return DatabaseManager.create_search_index(conn)
+
+    @staticmethod
+    def create_search_index(conn):
+        # Full-text index over history bodies, file names and summaries, filled in the background by the indexer.
+        # Returns False when this SQLite build lacks FTS5.
+        # Where SQLite can delete from contentless tables, the index keeps no copy of the text. Older builds store
+        # one, and its size (fts_size) counts toward the history size limit.
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(copy_history)')]
+        if 'file_names' not in columns:
+            conn.execute('ALTER TABLE copy_history ADD COLUMN file_names TEXT')
+        if 'fts_indexed' not in columns:
+            conn.execute('ALTER TABLE copy_history ADD COLUMN fts_indexed INTEGER DEFAULT 0')
+        if 'fts_size' not in columns:
+            conn.execute('ALTER TABLE copy_history ADD COLUMN fts_size INTEGER')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_copy_history_unindexed ON copy_history (id) WHERE fts_indexed = 0')
+        existing = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'history_fts'").fetchone()
+        options = ", content = '', contentless_delete = 1" if FTS_CONTENTLESS else ""
+        try:
+            if existing is not None and ('contentless_delete' in existing[0]) != FTS_CONTENTLESS:
+                # Built by the other kind of SQLite; rebuilt in the background by the indexer
+                conn.execute('DROP TABLE history_fts')
+                conn.execute('UPDATE copy_history SET fts_indexed = 0, fts_size = NULL WHERE fts_indexed = 1')
+            conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS history_fts
+                             USING fts5(content, file_names, summary, tokenize = 'unicode61'{options})''')
+        except sqlite3.OperationalError as e:
+            # Triggers left pointing at an unusable index would make every history delete fail
+            conn.execute('DROP TRIGGER IF EXISTS copy_history_fts_delete')
+            conn.execute('DROP TRIGGER IF EXISTS copy_history_fts_summary')
+            print(f"History search disabled: {e}")
+            return False
+        if not FTS_CONTENTLESS and 'fts_size' not in columns:
+            # Rows indexed before the index copy was counted
+            conn.execute('''UPDATE copy_history SET fts_size = (SELECT length(CAST(content AS BLOB)) FROM history_fts
+                                                                 WHERE rowid = copy_history.id)
+                            WHERE fts_indexed = 1''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS copy_history_fts_delete AFTER DELETE ON copy_history
+            WHEN OLD.fts_indexed = 1
+            BEGIN
+                DELETE FROM history_fts WHERE rowid = OLD.id;
+            END
+        ''')
+        if FTS_CONTENTLESS:
+            # A contentless row cannot be updated column by column; it is indexed again with the new summary
+            update_summary = '''DELETE FROM history_fts WHERE rowid = NEW.id;
+                                UPDATE copy_history SET fts_indexed = 0 WHERE id = NEW.id;'''
+        else:
+            update_summary = 'UPDATE history_fts SET summary = NEW.summary WHERE rowid = NEW.id;'
+        conn.execute('DROP TRIGGER IF EXISTS copy_history_fts_summary')
+        conn.execute(f'''
+            CREATE TRIGGER copy_history_fts_summary AFTER UPDATE OF summary ON copy_history
+            WHEN NEW.fts_indexed = 1
+            BEGIN
+                {update_summary}
+            END
+        ''')
+        return True
 
     def get_setting(self, key, default=None):
         conn = self.get_connection()
@@ -53,56 +446,391 @@ class DatabaseManager:
             self.return_connection(conn)
 
     def set_setting(self, key, value):
+        self.write(lambda conn: conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                                             (key, str(value))), wait=False)
+
+    def set_settings(self, values):
+        # All values in one transaction; waits so that later reads see them
+        self.write(lambda conn: conn.executemany('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                                                 [(key, str(value)) for key, value in values.items()]))
+
+    def add_copy_history(self, files_count, lines_count, content, file_names=(), base_id=None):
+        # content is the bundle, or a list of its chunks that are encoded one at a time so a large bundle is
+        # never held again as a whole string or as bytes
+        chunks = [content] if isinstance(content, str) else content
+        with instrumentation.measure("db.compress") as measurement:
+            content_hash, size = hash_chunks(chunks)
+            # Compress outside the write transaction so it does not hold up other writes
+            compressed = None if self.has_history_blob(content_hash) else compress_chunks(chunks, size)
+            measurement.size = size
+
+        def insert(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM history_blobs WHERE hash = ?', (content_hash,))
+            if cursor.fetchone() is None:
+                codec, blob = compressed or compress_chunks(chunks, size)
+                # Written through a blob handle: binding the body as a parameter would copy it twice more
+                cursor.execute('''INSERT INTO history_blobs (hash, codec, data, size, stored_size)
+                                  VALUES (?, ?, zeroblob(?), ?, ?)''',
+                               (content_hash, codec, len(blob), size, len(blob)))
+                with conn.blobopen('history_blobs', 'data', cursor.lastrowid) as handle:
+                    handle.write(blob)
+            cursor.execute('''INSERT INTO copy_history (files_count, lines_count, content_hash, file_names, base_id)
+                              VALUES (?, ?, ?, ?, ?)''',
+                           (files_count, lines_count, content_hash, "\n".join(file_names), base_id))
+            return cursor.lastrowid
+
+        with instrumentation.measure("db.insert"):
+            item_id = self.write(insert)
+        self.schedule_prune()
+        if self.search_available:
+            self.indexer.request()
+        return item_id
+
+    def has_history_blob(self, content_hash):
         conn = self.get_connection()
         try:
-            with conn:
-                conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, str(value)))
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1 FROM history_blobs WHERE hash = ?', (content_hash,))
+            return cursor.fetchone() is not None
         finally:
             self.return_connection(conn)
 
-    def add_copy_history(self, files_count, lines_count, content):
+    def set_history_retention(self, max_bytes, max_age_days):
+        self.history_max_bytes = max_bytes
+        self.history_max_age_days = max_age_days
+        self.schedule_prune()
+
+    def schedule_prune(self):
+        self.pruner.request()
+
+    def migrate_legacy_history(self):
+        # Rows from before blob storage keep their body inline, which makes every metadata read of them walk
+        # overflow pages; move those bodies into blobs
         conn = self.get_connection()
         try:
-            with conn:
-                cursor = conn.cursor()
-                cursor.execute('INSERT INTO copy_history (files_count, lines_count, content) VALUES (?, ?, ?)',
-                               (files_count, lines_count, content))
-                # Limit history to 20 items
-                cursor.execute('''DELETE FROM copy_history WHERE id NOT IN
-                                  (SELECT id FROM copy_history ORDER BY timestamp DESC LIMIT 20)''')
-                return cursor.lastrowid
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM copy_history WHERE content IS NOT NULL AND content_hash IS NULL')
+            legacy_ids = [row[0] for row in cursor.fetchall()]
         finally:
             self.return_connection(conn)
 
-    def update_copy_history_summary(self, item_id, summary):
+        for item_id in legacy_ids:
+            content = self.get_history_item_content(item_id)
+            if content is None:
+                continue
+            data = content.encode('utf-8')
+            content_hash = hashlib.sha256(data).hexdigest()
+            codec, blob = compress_content(data)
+
+            def move(conn, item_id=item_id, content_hash=content_hash, codec=codec, blob=blob, size=len(data)):
+                conn.execute('''INSERT OR IGNORE INTO history_blobs (hash, codec, data, size, stored_size)
+                                VALUES (?, ?, ?, ?, ?)''', (content_hash, codec, blob, size, len(blob)))
+                conn.execute('UPDATE copy_history SET content = NULL, content_hash = ? WHERE id = ?',
+                             (content_hash, item_id))
+
+            self.write(move)
+
+    def prune_history(self):
+        self.migrate_legacy_history()
+        self.prune_expired_history()
+        self.prune_summary_cache()
+        self.prune_copy_manifests()
+        self.vacuum_incrementally()
+
+    def prune_expired_history(self):
+        if self.history_max_age_days:
+            self.write(lambda conn: conn.execute("DELETE FROM copy_history WHERE timestamp < datetime('now', ?)",
+                                                 (f'-{self.history_max_age_days} days',)))
+        if not self.history_max_bytes:
+            return
+        # Walk newest to oldest over the primary key and the covering blob size index, counting each blob
+        # once and each row's copy in the search index, then drop everything older than the first row that does
+        # not fit in one range delete. The newest item is always kept.
         conn = self.get_connection()
         try:
-            with conn:
-                conn.execute('UPDATE copy_history SET summary = ? WHERE id = ?', (summary, item_id))
+            cursor = conn.cursor()
+            cursor.execute('''SELECT h.id, h.content_hash, b.stored_size, h.fts_size FROM copy_history h
+                              LEFT JOIN history_blobs b INDEXED BY idx_history_blobs_size ON b.hash = h.content_hash
+                              ORDER BY h.id DESC''')
+            seen = set()
+            total = 0
+            cutoff = None
+            for index, (item_id, content_hash, stored_size, fts_size) in enumerate(cursor):
+                if content_hash not in seen:
+                    seen.add(content_hash)
+                    total += stored_size or 0
+                total += fts_size or 0
+                if total > self.history_max_bytes and index > 0:
+                    cutoff = item_id
+                    break
         finally:
             self.return_connection(conn)
+        if cutoff is not None:
+            self.write(lambda conn: conn.execute('DELETE FROM copy_history WHERE id <= ?', (cutoff,)))
 
-    def get_copy_history(self):
+    def vacuum_incrementally(self):
+        # Return freed pages to the filesystem a few at a time; each step is its own write so queued history
+        # inserts and summary updates interleave with it. Stops once a step frees nothing more.
+        conn = self.get_connection()
+        try:
+            incremental = conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        finally:
+            self.return_connection(conn)
+        if not incremental:
+            return
+
+        def vacuum_step(conn):
+            conn.execute(f'PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})').fetchall()
+            return conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+        remaining = None
+        while True:
+            free_pages = self.write(vacuum_step, transactional=False)
+            if not free_pages or (remaining is not None and free_pages >= remaining):
+                break
+            remaining = free_pages
+
+    def index_pending_history(self):
+        # Newest first, one item per write so indexing never holds the writer for long
+        while True:
+            conn = self.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute('SELECT id FROM copy_history WHERE fts_indexed = 0 ORDER BY id DESC LIMIT 16')
+                pending = [row[0] for row in cursor.fetchall()]
+            finally:
+                self.return_connection(conn)
+            if not pending:
+                return
+            for item_id in pending:
+                content = self.get_history_item_content(item_id) or ""
+
+                content = content[:SEARCH_INDEX_MAX_CHARS]
+                fts_size = None if FTS_CONTENTLESS else len(content.encode('utf-8'))
+
+                def index(conn, item_id=item_id, content=content, fts_size=fts_size):
+                    # Reads names and summary inside the transaction, and inserts nothing if the row is gone
+                    conn.execute('''INSERT INTO history_fts (rowid, content, file_names, summary)
+                                    SELECT id, ?, file_names, summary FROM copy_history WHERE id = ?''',
+                                 (content, item_id))
+                    conn.execute('UPDATE copy_history SET fts_indexed = 1, fts_size = ? WHERE id = ?',
+                                 (fts_size, item_id))
+
+                self.write(index)
+
+    def search_history(self, query, limit=SEARCH_RESULTS_LIMIT):
+        # Returns (id, files_count, lines_count, summary, snippet) ranked by bm25, names and summaries weighted up
+        terms = re.findall(r'\w+', query)
+        if not terms or not self.search_available:
+            return []
+        match = " ".join(f'"{term}"*' for term in terms)
+        started = time.perf_counter()
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''SELECT h.id, h.files_count, h.lines_count, h.summary
+                              FROM history_fts JOIN copy_history h ON h.id = history_fts.rowid
+                              WHERE history_fts MATCH ?
+                              ORDER BY bm25(history_fts, 1.0, 5.0, 10.0) LIMIT ?''', (match, limit))
+            rows = cursor.fetchall()
+        finally:
+            self.return_connection(conn)
+        # FTS5's snippet() is quadratic in the number of hits, which stalls on large repetitive bundles;
+        # snippets come from the head of each result instead
+        pattern = re.compile(r'\b(?:' + '|'.join(map(re.escape, terms)) + r')\w*', re.IGNORECASE)
+        # Case-insensitive word-start searches are slow on a whole sample; the first hit is found case-sensitively
+        # in the lowercased text, and the full pattern only brackets terms inside the excerpt
+        finder = re.compile('|'.join(re.escape(term.lower()) for term in terms))
+        results = [(*row, self.make_snippet(row[0], pattern, finder)) for row in rows]
+        instrumentation.record("db.search", time.perf_counter() - started)
+        return results
+
+    def make_snippet(self, item_id, pattern, finder):
+        sample = self.get_history_item_sample(item_id, SNIPPET_SAMPLE_BYTES)
+        text = sample[0] if sample else ""
+        found = find_word_start(finder, text.lower())
+        start = max(found - SNIPPET_CONTEXT_CHARS, 0) if found is not None else 0
+        excerpt = text[start:start + 2 * SNIPPET_CONTEXT_CHARS]
+        excerpt = pattern.sub(lambda hit: f'[{hit.group(0)}]', excerpt)
+        return ('...' if start else '') + excerpt + ('...' if start + 2 * SNIPPET_CONTEXT_CHARS < len(text) else '')
+
+    def update_copy_history_summary(self, item_id, summary):
+        future = self.write(lambda conn: conn.execute('UPDATE copy_history SET summary = ? WHERE id = ?',
+                                                      (summary, item_id)), wait=False)
+        if FTS_CONTENTLESS and self.search_available:
+            future.add_done_callback(lambda _: self.indexer.request())  # the trigger queued the row for indexing
+
+    def get_copy_history(self, limit=HISTORY_MENU_SIZE):
+        # Metadata only; bodies are fetched by id when an item is used
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute(
-                'SELECT id, files_count, lines_count, content, summary FROM copy_history ORDER BY timestamp DESC LIMIT 20')
+            cursor.execute('''SELECT id, files_count, lines_count, summary FROM copy_history
+                              ORDER BY timestamp DESC, id DESC LIMIT ?''', (limit,))
             return cursor.fetchall()
         finally:
             self.return_connection(conn)
 
     def get_history_item_content(self, item_id):
+        started = time.perf_counter()
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute('SELECT content FROM copy_history WHERE id = ?', (item_id,))
+            cursor.execute('''SELECT h.content, b.codec, b.data FROM copy_history h
+                              LEFT JOIN history_blobs b ON b.hash = h.content_hash
+                              WHERE h.id = ?''', (item_id,))
             result = cursor.fetchone()
-            return result[0] if result else None
         finally:
             self.return_connection(conn)
+        if result is None:
+            return None
+        content, codec, data = result
+        content = decompress_content(codec, data) if data is not None else content
+        instrumentation.record("db.read_content", time.perf_counter() - started, len(content or ""))
+        return content
+
+    def get_history_item_size(self, item_id):
+        # Size of the stored content in bytes (characters for legacy rows), or None if the item was pruned
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''SELECT COALESCE(b.size, LENGTH(h.content), 0) FROM copy_history h
+                              LEFT JOIN history_blobs b ON b.hash = h.content_hash
+                              WHERE h.id = ?''', (item_id,))
+            result = cursor.fetchone()
+        finally:
+            self.return_connection(conn)
+        return result[0] if result else None
+
+    def get_history_item_sample(self, item_id, max_bytes):
+        # Returns (head of the content, file names or None for rows that predate them), or None if pruned.
+        # Only the compressed bytes the head needs are read out of the blob.
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''SELECT h.content, h.file_names, b.codec, b.rowid FROM copy_history h
+                              LEFT JOIN history_blobs b ON b.hash = h.content_hash
+                              WHERE h.id = ?''', (item_id,))
+            result = cursor.fetchone()
+            if result is None:
+                return None
+            content, file_names, codec, blob_id = result
+            if blob_id is None:
+                sample = (content or "")[:max_bytes]
+            else:
+                with conn.blobopen('history_blobs', 'data', blob_id, readonly=True) as blob:
+                    sample = decompress_prefix(codec, blob, max_bytes)
+        finally:
+            self.return_connection(conn)
+        return sample, file_names.split("\n") if file_names else None
+
+    def get_cached_summary(self, item_id, model):
+        # Returns (summary, seconds the original generation took) for the item's content, or None
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''SELECT s.content_hash, s.summary, s.seconds FROM copy_history h
+                              JOIN summary_cache s ON s.content_hash = h.content_hash AND s.model = ?
+                              WHERE h.id = ?''', (model, item_id))
+            result = cursor.fetchone()
+        finally:
+            self.return_connection(conn)
+        if result is None:
+            return None
+        content_hash, summary, seconds = result
+        self.write(lambda conn: conn.execute('''UPDATE summary_cache SET hits = hits + 1,
+                                                last_used = CURRENT_TIMESTAMP
+                                                WHERE content_hash = ? AND model = ?''', (content_hash, model)),
+                   wait=False)
+        return summary, seconds
+
+    def set_cached_summary(self, item_id, model, summary, seconds):
+        self.write(lambda conn: conn.execute('''INSERT OR REPLACE INTO summary_cache
+                                                (content_hash, model, summary, seconds)
+                                                SELECT content_hash, ?, ?, ? FROM copy_history
+                                                WHERE id = ? AND content_hash IS NOT NULL''',
+                                             (model, summary, seconds, item_id)))
+
+    def get_summary_cache_stats(self):
+        # Returns (entries, hits, seconds of generation saved by those hits)
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*), TOTAL(hits), TOTAL(hits * seconds) FROM summary_cache')
+            return cursor.fetchone()
+        finally:
+            self.return_connection(conn)
+
+    def prune_summary_cache(self):
+        self.write(lambda conn: conn.execute('''DELETE FROM summary_cache WHERE rowid IN (
+                                                    SELECT rowid FROM summary_cache
+                                                    ORDER BY last_used DESC LIMIT -1 OFFSET ?)''',
+                                             (SUMMARY_CACHE_MAX_ENTRIES,)))
+
+    def clear_summary_cache(self, keep_model=None):
+        self.write(lambda conn: conn.execute('DELETE FROM summary_cache WHERE model IS NOT ?', (keep_model,)),
+                   wait=False)
+
+    def get_copy_manifest(self, root):
+        # Returns (item_id of the copy it was taken for, {file_path: (size, mtime_ns, inode)}), or None
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT item_id, codec, data FROM copy_manifests WHERE root = ?', (root,))
+            result = cursor.fetchone()
+        finally:
+            self.return_connection(conn)
+        if result is None:
+            return None
+        item_id, codec, data = result
+        return item_id, {path: tuple(key) for path, key in json.loads(decompress_content(codec, data)).items()}
+
+    def prune_copy_manifests(self):
+        self.write(lambda conn: conn.execute('''DELETE FROM copy_manifests WHERE rowid IN (
+                                                    SELECT rowid FROM copy_manifests
+                                                    ORDER BY stored_at DESC LIMIT -1 OFFSET ?)''',
+                                             (COPY_MANIFESTS_MAX_ENTRIES,)))
+
+    def set_copy_manifests(self, item_id, manifests):
+        # manifests: [(root, {file_path: fingerprint})] of one copy; compressed before entering the write queue
+        rows = [(root, item_id, *compress_content(json.dumps(manifest).encode('utf-8')), len(manifest))
+                for root, manifest in manifests]
+        self.write(lambda conn: conn.executemany('''INSERT OR REPLACE INTO copy_manifests
+                                                    (root, item_id, codec, data, files)
+                                                    VALUES (?, ?, ?, ?, ?)''', rows))
+
+    def get_cached_file(self, path):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT size, mtime_ns, inode, content, line_count FROM file_cache WHERE path = ?', (path,))
+            return cursor.fetchone()
+        finally:
+            self.return_connection(conn)
+
+    def set_cached_files(self, entries):
+        rows = [(*entry, len(entry[4])) for entry in entries]
+        self.write(lambda conn: conn.executemany('''INSERT OR REPLACE INTO file_cache
+                                                    (path, size, mtime_ns, inode, content, line_count, bytes)
+                                                    VALUES (?, ?, ?, ?, ?, ?, ?)''', rows), wait=False)
+
+    def prune_file_cache(self, max_bytes):
+        # Keep the most recently stored entries that fit in max_bytes
+        self.write(lambda conn: conn.execute('''DELETE FROM file_cache WHERE path IN (
+                                                    SELECT path FROM (
+                                                        SELECT path, SUM(bytes) OVER (
+                                                            ORDER BY stored_at DESC, rowid DESC) AS total
+                                                        FROM file_cache)
+                                                    WHERE total > ?)''', (max_bytes,)), wait=False)
+
+    def clear_file_cache(self):
+        self.write(lambda conn: conn.execute('DELETE FROM file_cache'), wait=False)
 
     def close(self):
+        # Pending writes are flushed before the writer connection closes
+        self.write_queue.put(None)
+        self.writer_thread.join()
         while not self.connection_pool.empty():
             conn = self.connection_pool.get()
             conn.close()
@@ -0,0 +1,115 @@
+import sys
+from collections import OrderedDict
+from threading import Lock
+
+DISK_PRUNE_INTERVAL = 256  # disk tier writes between size checks
+
+
+class FileContentCache:
+    # Decoded file contents keyed by path and validated against (size, mtime, inode) from a fresh stat.
+    # An in-memory LRU bounded in bytes sits in front of an optional on-disk tier stored in the SQLite database.
+    def __init__(self, db_manager, max_size, use_disk_cache=False, max_disk_size=0):
+        self.db_manager = db_manager
+        self.max_size = max_size
+        self.use_disk_cache = use_disk_cache
+        self.max_disk_size = max_disk_size
+        self.entries = OrderedDict()  # path -> (key, content, line_count, size)
+        self.current_size = 0
+        self.pending_disk_writes = []
+        self.disk_writes_since_prune = 0
+        self.lock = Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(stat):
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def get(self, file_path, stat):
+        key = self.make_key(stat)
+        with self.lock:
+            entry = self.entries.get(file_path)
+            if entry is not None and entry[0] == key:
+                self.entries.move_to_end(file_path)
+                self.hits += 1
+                return entry[1], entry[2]
+
+        if self.use_disk_cache:
+            row = self.db_manager.get_cached_file(file_path)
+            if row is not None and tuple(row[:3]) == key:
+                content, line_count = row[3], row[4]
+                with self.lock:
+                    self.disk_hits += 1
+                    self.store(file_path, key, content, line_count)
+                return content, line_count
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, file_path, stat, content, line_count):
+        key = self.make_key(stat)
+        with self.lock:
+            self.store(file_path, key, content, line_count)
+            if self.use_disk_cache:
+                self.pending_disk_writes.append((file_path, *key, content, line_count))
+
+    def store(self, file_path, key, content, line_count):
+        size = sys.getsizeof(content)
+        if size > self.max_size:
+            return
+        previous = self.entries.pop(file_path, None)
+        if previous is not None:
+            self.current_size -= previous[3]
+        self.entries[file_path] = (key, content, line_count, size)
+        self.current_size += size
+        while self.current_size > self.max_size:
+            _, evicted = self.entries.popitem(last=False)
+            self.current_size -= evicted[3]
+            self.evictions += 1
+
+    def flush(self):
+        # Disk tier writes are batched into one transaction per processed path
+        with self.lock:
+            writes, self.pending_disk_writes = self.pending_disk_writes, []
+        if not writes:
+            return
+        self.db_manager.set_cached_files(writes)
+        self.disk_writes_since_prune += len(writes)
+        if self.max_disk_size and self.disk_writes_since_prune >= DISK_PRUNE_INTERVAL:
+            self.disk_writes_since_prune = 0
+            self.db_manager.prune_file_cache(self.max_disk_size)
+
+    def resize(self, max_size, use_disk_cache, max_disk_size):
+        with self.lock:
+            self.max_size = max_size
+            self.use_disk_cache = use_disk_cache
+            self.max_disk_size = max_disk_size
+            while self.entries and self.current_size > self.max_size:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_size -= evicted[3]
+                self.evictions += 1
+        if max_disk_size:
+            self.db_manager.prune_file_cache(max_disk_size)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_size = 0
+            self.pending_disk_writes = []
+        self.db_manager.clear_file_cache()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "size": self.current_size,
+            }
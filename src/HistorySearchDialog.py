@@ -0,0 +1,69 @@
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLineEdit, QListWidget, QListWidgetItem, QLabel
+
+SEARCH_DEBOUNCE_MS = 200
+
+
+class HistorySearchDialog(QDialog):
+    def __init__(self, db_manager, on_activate, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.on_activate = on_activate
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("Search History")
+        self.resize(600, 400)
+        layout = QVBoxLayout()
+
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("Search copied content, file names and summaries")
+        self.query_edit.textChanged.connect(self.schedule_search)
+        self.query_edit.returnPressed.connect(self.activate_first)
+        layout.addWidget(self.query_edit)
+
+        self.results_list = QListWidget()
+        self.results_list.itemActivated.connect(self.activate_item)
+        layout.addWidget(self.results_list)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        # Typing restarts the timer, so only the last query of a burst hits the index
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.run_search)
+
+        self.setLayout(layout)
+
+    def schedule_search(self):
+        self.search_timer.start()
+
+    def run_search(self):
+        self.results_list.clear()
+        query = self.query_edit.text().strip()
+        if not query:
+            self.status_label.setText("")
+            return
+        results = self.db_manager.search_history(query)
+        for item_id, files_count, lines_count, summary, snippet in results:
+            text = f"{files_count} file(s), {lines_count} line(s)"
+            if summary and not summary.startswith("Error:"):
+                text += f" - {summary}"
+            text += "\n" + " ".join(snippet.split())
+            item = QListWidgetItem(text)
+            item.setData(Qt.ItemDataRole.UserRole, item_id)
+            self.results_list.addItem(item)
+        self.status_label.setText(f"{len(results)} match(es)" if results else "No matches")
+
+    def activate_item(self, item):
+        self.on_activate(item.data(Qt.ItemDataRole.UserRole))
+        self.accept()
+
+    def activate_first(self):
+        if self.search_timer.isActive():
+            self.search_timer.stop()
+            self.run_search()
+        if self.results_list.count():
+            self.activate_item(self.results_list.item(0))
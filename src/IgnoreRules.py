@@ -0,0 +1,149 @@
+import os
+import re
+
+IGNORE_FILE_NAMES = ('.gitignore', '.ignore')
+
+
+def translate_pattern(pattern):
+    # gitignore glob -> regex over '/'-separated paths relative to the ignore file's directory
+    anchored = '/' in pattern
+    if pattern.startswith('/'):
+        pattern = pattern[1:]
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                parts.append(re.escape('['))
+                i += 1
+            else:
+                body = pattern[i + 1:end].replace('\\', '\\\\')
+                if body[0] in '!^':
+                    body = '^' + body[1:]
+                parts.append(f'[{body}]')
+                i = end + 1
+        elif pattern[i] == '\\' and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    body = ''.join(parts)
+    return body if anchored else f'(?:.*/)?{body}'
+
+
+def parse_pattern(line):
+    # Returns (regex, negated, dir_only) or None for blank lines and comments
+    if line.endswith('\n'):
+        line = line[:-1]
+    if line.endswith('\r'):
+        line = line[:-1]
+    stripped = line.rstrip(' ')
+    if line.endswith('\\ ') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    if not line or line.startswith('#'):
+        return None
+    negated = line.startswith('!')
+    if negated or line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    return translate_pattern(line), negated, dir_only
+
+
+class IgnoreMatcher:
+    # All rules of one ignore source compiled into a single regex per entry kind. Alternatives are listed
+    # last rule first, so the group that matches is the rule gitignore semantics say wins.
+    def __init__(self, lines):
+        rules = [rule for rule in map(parse_pattern, lines) if rule is not None]
+        self.file_matcher = self.compile([rule for rule in rules if not rule[2]])
+        self.dir_matcher = self.compile(rules)
+
+    @staticmethod
+    def compile(rules):
+        if not rules:
+            return None
+        rules = rules[::-1]
+        regex = re.compile('|'.join(f'({rule[0]})' for rule in rules), re.DOTALL)
+        return regex, [rule[1] for rule in rules]
+
+    def __bool__(self):
+        return self.dir_matcher is not None
+
+    def match(self, relative_path, is_dir):
+        # True if ignored, False if re-included by a negated rule, None if no rule applies
+        matcher = self.dir_matcher if is_dir else self.file_matcher
+        if matcher is None:
+            return None
+        regex, negations = matcher
+        match = regex.fullmatch(relative_path)
+        if match is None:
+            return None
+        return not negations[match.lastindex - 1]
+
+
+class IgnoreRules:
+    # Traversal-time filter: ignore files found while walking plus a global exclude list, and the
+    # supported extensions compiled into one suffix tuple.
+    def __init__(self, global_excludes=(), use_ignore_files=True, supported_extensions=None):
+        self.global_matcher = IgnoreMatcher(global_excludes)
+        self.use_ignore_files = use_ignore_files
+        self.suffixes = tuple(supported_extensions) if supported_extensions is not None else None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.global_excludes, settings.respect_ignore_files,
+                   None if settings.process_all_files else settings.supported_extensions)
+
+    def is_supported(self, file_path):
+        return self.suffixes is None or file_path.endswith(self.suffixes)
+
+    def root_scope(self, top):
+        base = top.rstrip(os.sep) or top
+        return ((len(base) + 1, self.global_matcher),) if self.global_matcher else ()
+
+    def enter(self, directory, scope, names):
+        # Called with the entry names of a directory before any of them are filtered
+        if not self.use_ignore_files:
+            return scope
+        lines = []
+        for name in IGNORE_FILE_NAMES:
+            if name in names:
+                try:
+                    with open(os.path.join(directory, name), encoding='utf-8', errors='replace') as file:
+                        lines.extend(file)
+                except OSError:
+                    continue
+        matcher = IgnoreMatcher(lines) if lines else None
+        if not matcher:
+            return scope
+        base = directory.rstrip(os.sep) or directory
+        return scope + ((len(base) + 1, matcher),)
+
+    def is_ignored(self, scope, path, is_dir):
+        # Deeper ignore files take precedence; the global list has the lowest priority
+        for prefix_length, matcher in reversed(scope):
+            relative_path = path[prefix_length:]
+            if os.sep != '/':
+                relative_path = relative_path.replace(os.sep, '/')
+            decision = matcher.match(relative_path, is_dir)
+            if decision is not None:
+                return decision
+        return False
@@ -0,0 +1,160 @@
+import cProfile
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+
+HISTOGRAM_SIZE = 512  # most recent samples kept per stage
+
+
+class RollingHistogram:
+    # Fixed-size window of recent samples; percentiles are computed on demand
+    def __init__(self, size=HISTOGRAM_SIZE):
+        self.samples = deque(maxlen=size)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def summary(self):
+        values = sorted(self.samples)
+        if not values:
+            return {'count': 0}
+        return {
+            'count': len(values),
+            'mean': sum(values) / len(values),
+            'p50': values[len(values) // 2],
+            'p95': values[min(int(len(values) * 0.95), len(values) - 1)],
+            'max': values[-1],
+        }
+
+
+class Measurement:
+    def __init__(self):
+        self.size = 0
+        self.files = 0
+
+
+class Stage:
+    def __init__(self):
+        self.durations = RollingHistogram()  # milliseconds
+        self.sizes = RollingHistogram()  # characters or bytes handled per call
+        self.files_per_second = RollingHistogram()
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.total_size = 0
+        self.total_files = 0
+
+
+class Instrumentation:
+    # Per-stage timings of the copy pipeline, shared by every thread. Recording is a lock and a few appends,
+    # cheap enough to stay on permanently.
+    def __init__(self):
+        self.lock = Lock()
+        self.stages = {}
+        self.started = time.time()
+        self.profile_dir = None
+        self.profiles_requested = 0
+        self.profile_paths = []
+
+    def record(self, stage, seconds, size=0, files=0):
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = Stage()
+            entry.calls += 1
+            entry.total_seconds += seconds
+            entry.total_size += size
+            entry.total_files += files
+            entry.durations.add(seconds * 1000)
+            if size:
+                entry.sizes.add(size)
+            if files and seconds > 0:
+                entry.files_per_second.add(files / seconds)
+
+    @contextmanager
+    def measure(self, stage):
+        # Set .size and .files on the yielded object to record amounts along with the duration
+        measurement = Measurement()
+        started = time.perf_counter()
+        try:
+            yield measurement
+        finally:
+            self.record(stage, time.perf_counter() - started, measurement.size, measurement.files)
+
+    def iterate(self, stage, iterable):
+        # Records the time spent producing items, not the time the consumer spends on them
+        iterator = iter(iterable)
+        seconds = 0.0
+        count = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - started
+                    return
+                seconds += time.perf_counter() - started
+                count += 1
+                yield item
+        finally:
+            if hasattr(iterator, 'close'):
+                iterator.close()
+            self.record(stage, seconds, files=count)
+
+    def snapshot(self):
+        with self.lock:
+            stages = {
+                name: {
+                    'calls': stage.calls,
+                    'total_seconds': stage.total_seconds,
+                    'total_size': stage.total_size,
+                    'total_files': stage.total_files,
+                    'duration_ms': stage.durations.summary(),
+                    'size': stage.sizes.summary(),
+                    'files_per_second': stage.files_per_second.summary(),
+                }
+                for name, stage in self.stages.items()
+            }
+            return {'since': self.started, 'stages': stages, 'profiles': list(self.profile_paths)}
+
+    def export_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.snapshot(), file, indent=2, sort_keys=True)
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.started = time.time()
+
+    def request_profiles(self, count):
+        with self.lock:
+            self.profiles_requested = count
+
+    @contextmanager
+    def profile(self, name):
+        # cProfile around the block while profiles are requested. Only the calling thread is profiled;
+        # pool workers show up as the time spent waiting on them.
+        with self.lock:
+            enabled = self.profiles_requested > 0 and self.profile_dir is not None
+            if enabled:
+                self.profiles_requested -= 1
+        if not enabled:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{id(profiler):x}.prof")
+            profiler.dump_stats(path)
+            with self.lock:
+                self.profile_paths.append(path)
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,29 @@
+from PyQt6.QtCore import QMimeData
+from Instrumentation import instrumentation
+
+TEXT_FORMATS = ("text/plain", "text/plain;charset=utf-8")
+
+
+class LazyMimeData(QMimeData):
+    # Advertises plain text but calls render() only when a consumer asks for the data, i.e. at paste time.
+    # The rendered text is kept afterwards, since a single paste usually asks for it more than once.
+    def __init__(self, render):
+        super().__init__()
+        self.render = render
+        self.text_cache = None
+
+    def formats(self):
+        return list(TEXT_FORMATS)
+
+    def hasFormat(self, mime_type):
+        return mime_type in TEXT_FORMATS
+
+    def retrieveData(self, mime_type, preferred_type):
+        # Qt converts the string to bytes itself when a platform asks for a QByteArray
+        if mime_type not in TEXT_FORMATS:
+            return None
+        if self.text_cache is None:
+            with instrumentation.measure("clipboard.render") as measurement:
+                self.text_cache = self.render() or ""
+                measurement.size = len(self.text_cache)
+        return self.text_cache
@@ -0,0 +1,32 @@
+from threading import Lock, Thread
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from utils import get_installed_ollama_models
+
+
+class ModelDiscovery(QObject):
+    # Asks Ollama for its installed models on a background thread, so an unreachable server never
+    # blocks the UI. models_ready is only emitted when the server answered, finished after every attempt.
+    models_ready = pyqtSignal(list)
+    finished = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.lock = Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return  # a request is already in flight; its result goes to every listener
+            self.thread = Thread(target=self.run, name="ollama-models", daemon=True)
+            self.thread.start()
+
+    def run(self):
+        models = get_installed_ollama_models()
+        with self.lock:
+            self.thread = None
+        if models is not None:
+            self.models_ready.emit(models)
+        self.finished.emit()
@@ -0,0 +1,242 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from PyQt6.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+from IgnoreRules import IgnoreRules
+from processing import SECTION_SEPARATOR, iter_content_chunks, read_files, section_header, walk_files
+
+CHANGE_DEBOUNCE_MS = 300
+
+
+def stat_key(stat):
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class PinnedFolder:
+    # Per-file sections of one pinned tree in walk order, plus the joined bundle built on demand
+    def __init__(self, root):
+        self.root = root
+        self.order = []
+        self.sections = {}  # file_path -> (stat_key, file, content, line_count)
+        self.bundle = None
+        self.ready = False
+        self.unwatched = set()  # paths the watcher refused, e.g. when inotify watches run out
+        self.lock = Lock()
+
+    def scan(self, settings, cache):
+        # Stat pass over the tree; only files that are new or whose stat changed get (re)read
+        directories = []
+        order = []
+        sections = {}
+        keys = {}
+        to_read = []
+        rules = IgnoreRules.from_settings(settings)
+        for file, file_path in walk_files(self.root, directories, rules):
+            if not rules.is_supported(file_path):
+                continue
+            try:
+                key = stat_key(os.stat(file_path))
+            except OSError:
+                continue
+            order.append(file_path)
+            existing = self.sections.get(file_path)
+            if existing is not None and existing[0] == key:
+                sections[file_path] = existing
+            else:
+                keys[file_path] = key
+                to_read.append((file, file_path))
+
+        try:
+            for file, file_path, (content, line_count) in read_files(to_read, settings.max_file_size * 1024 * 1024,
+                                                                     settings.read_workers, cache):
+                sections[file_path] = (keys[file_path], file, content, line_count)
+        finally:
+            if cache is not None:
+                cache.flush()
+
+        with self.lock:
+            self.order = order
+            self.sections = sections
+            self.bundle = None
+            self.ready = True
+        return directories + order
+
+    def refresh_files(self, file_paths, settings, cache):
+        # Rebuild only the sections of changed files; returns False when the tree layout changed
+        to_read = []
+        keys = {}
+        for file_path in file_paths:
+            existing = self.sections.get(file_path)
+            if existing is None:
+                continue
+            try:
+                key = stat_key(os.stat(file_path))
+            except OSError:
+                return False
+            if key != existing[0]:
+                keys[file_path] = key
+                to_read.append((existing[1], file_path))
+
+        updated = {}
+        try:
+            for file, file_path, (content, line_count) in read_files(to_read, settings.max_file_size * 1024 * 1024,
+                                                                     settings.read_workers, cache):
+                updated[file_path] = (keys[file_path], file, content, line_count)
+        finally:
+            if cache is not None:
+                cache.flush()
+        if updated:
+            with self.lock:
+                self.sections.update(updated)
+                self.bundle = None
+        return True
+
+    def get_bundle(self):
+        with self.lock:
+            # Changes under an unwatched path would go unnoticed, so copies fall back to normal processing
+            if not self.ready or self.unwatched:
+                return None
+            if self.bundle is None:
+                chunks = []
+                lines_count = 0
+                file_names = []
+                for file_path in self.order:
+                    _, file, content, line_count = self.sections[file_path]
+                    chunks.append(section_header(file, file_path))
+                    chunks.extend(iter_content_chunks(content))
+                    chunks.append(SECTION_SEPARATOR)
+                    lines_count += line_count
+                    file_names.append(file)
+                self.bundle = ("".join(chunks), len(self.order), lines_count, file_names)
+            return self.bundle
+
+
+class PinnedFolderManager(QObject):
+    # Keeps process_path output for pinned directories up to date from filesystem notifications.
+    # Lives in the GUI thread; scans run one at a time on a background worker.
+    watch_paths = pyqtSignal(object, list, bool)
+
+    def __init__(self, settings, file_cache=None):
+        super().__init__()
+        self.settings = settings
+        self.file_cache = file_cache
+        self.folders = {}
+        self.pending_files = set()
+        self.pending_roots = set()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        self.watch_paths.connect(self.add_watch_paths)
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(CHANGE_DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.apply_changes)
+        for root in self.settings.pinned_folders:
+            self.start_folder(root)
+
+    @staticmethod
+    def normalize(path):
+        return os.path.normpath(os.path.abspath(path))
+
+    def roots(self):
+        return list(self.folders)
+
+    def pin(self, path):
+        root = self.normalize(path)
+        if root in self.folders or not os.path.isdir(root):
+            return False
+        self.start_folder(root)
+        self.settings.pinned_folders = self.roots()
+        self.settings.save_pinned_folders()
+        return True
+
+    def unpin(self, path):
+        root = self.normalize(path)
+        if self.folders.pop(root, None) is None:
+            return
+        prefix = root + os.sep
+        watched = [p for p in self.watcher.files() + self.watcher.directories() if p == root or p.startswith(prefix)]
+        if watched:
+            self.watcher.removePaths(watched)
+        self.settings.pinned_folders = self.roots()
+        self.settings.save_pinned_folders()
+
+    def start_folder(self, root):
+        folder = PinnedFolder(root)
+        self.folders[root] = folder
+        self.executor.submit(self.scan_folder, folder)
+
+    def scan_folder(self, folder):
+        try:
+            paths = folder.scan(self.settings, self.file_cache)
+        except Exception as e:
+            print(f"Error scanning pinned folder {folder.root}: {e}")
+            return
+        if self.folders.get(folder.root) is folder:
+            self.watch_paths.emit(folder, paths, True)
+
+    def refresh_folder(self, folder, file_paths):
+        try:
+            if folder.refresh_files(file_paths, self.settings, self.file_cache):
+                # Atomic saves replace the file, which drops it from the watcher
+                self.watch_paths.emit(folder, list(file_paths), False)
+                return
+        except Exception as e:
+            print(f"Error refreshing pinned folder {folder.root}: {e}")
+        self.scan_folder(folder)
+
+    def rescan_all(self):
+        # Settings changed (filters, size limits): rebuild every section from scratch
+        for root in self.roots():
+            self.start_folder(root)
+
+    def add_watch_paths(self, folder, paths, full_scan):
+        # full_scan: paths lists the whole tree, so it replaces what was unwatched before
+        watched = set(self.watcher.files()) | set(self.watcher.directories())
+        new_paths = [path for path in paths if path not in watched and os.path.exists(path)]
+        failed = set(self.watcher.addPaths(new_paths)) if new_paths else set()
+        if failed and not folder.unwatched:
+            print(f"Could not watch {len(failed)} path(s) in pinned folder {folder.root}; copying it normally")
+        with folder.lock:
+            folder.unwatched = failed if full_scan else (folder.unwatched - set(paths)) | failed
+
+    def folder_for(self, path):
+        for root, folder in self.folders.items():
+            if path == root or path.startswith(root + os.sep):
+                return folder
+        return None
+
+    def on_directory_changed(self, path):
+        folder = self.folder_for(path)
+        if folder is not None:
+            self.pending_roots.add(folder.root)
+            self.debounce_timer.start()
+
+    def on_file_changed(self, path):
+        self.pending_files.add(path)
+        self.debounce_timer.start()
+
+    def apply_changes(self):
+        roots, self.pending_roots = self.pending_roots, set()
+        files, self.pending_files = self.pending_files, set()
+        for root in roots:
+            folder = self.folders.get(root)
+            if folder is not None:
+                self.executor.submit(self.scan_folder, folder)
+        changed_by_folder = {}
+        for path in files:
+            folder = self.folder_for(path)
+            if folder is not None and folder.root not in roots:
+                changed_by_folder.setdefault(folder, []).append(path)
+        for folder, paths in changed_by_folder.items():
+            self.executor.submit(self.refresh_folder, folder, paths)
+
+    def get_bundle(self, path):
+        # Returns (content, files_count, lines_count, file_names) for a pinned, fully scanned path, else None
+        folder = self.folders.get(self.normalize(path))
+        return folder.get_bundle() if folder is not None else None
+
+    def shutdown(self):
+        self.debounce_timer.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,148 @@
+import os
+import time
+from threading import Event, Thread
+from processing import BundleBuilder, iter_candidate_files, priority_budget, scan_manifest
+
+PROGRESS_INTERVAL = 0.25  # seconds between progress callbacks
+COUNT_DELAY = 0.5  # seconds before the counting walk starts, so quick copies never pay for it
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class DeadlineReached(Exception):
+    pass
+
+
+class ProcessingJob:
+    # One copy's bundling run. Cancellation and the deadline are checked between files, so a huge input can be
+    # stopped at any time. Jobs still running after COUNT_DELAY start a second walk that counts the files the run
+    # is going to read, which gives the progress total and the ETA. In priority mode the ranking gives that count.
+    # With a db_manager, a manifest of file fingerprints is taken for every copied folder; with delta as well,
+    # folders that have a stored manifest only contribute the files changed since then. Plain files, archives
+    # included, are always copied in full.
+    def __init__(self, file_paths, settings, cache=None, pinned_folders=None, timeout=0, on_progress=None,
+                 on_check=None, db_manager=None, delta=False):
+        self.file_paths = file_paths
+        self.settings = settings
+        self.pinned_folders = pinned_folders
+        self.db_manager = db_manager
+        self.delta = delta
+        self.manifests = []  # (path, {file_path: fingerprint}) to store once the copy is in history
+        self.base_id = None  # history item the first delta is against
+        self.on_progress = on_progress  # called with the job at most every PROGRESS_INTERVAL seconds
+        self.on_check = on_check  # called with the job between files; may cancel() it
+        self.builder = BundleBuilder(settings.max_output_size * 1024 * 1024, cache, on_section=self.on_section,
+                                     on_scan=self.check, on_plan=self.on_plan)
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.cancel_reason = None
+        self.finished = Event()
+        self.files_done = 0
+        self.files_total = 0
+        self.counting_done = False
+        self.last_progress = self.started
+
+    def cancel(self, reason="cancelled"):
+        # Safe to call from any thread; the job stops before its next file
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+
+    def run(self):
+        # Returns the BundleBuilder, or raises JobCancelled. Reaching the deadline keeps what was bundled so far,
+        # like the output size limit does.
+        Thread(target=self.count_files, name="job-count", daemon=True).start()
+        try:
+            self.check()
+            if self.settings.assembly_mode == "priority":
+                # Ranks across all paths at once; pinned bundles are complete folders and are not used
+                self.builder.add_paths_by_priority(self.file_paths, self.settings, priority_budget(self.settings))
+                return self.builder
+            for path in self.file_paths:
+                previous = None
+                if self.db_manager is not None and os.path.isdir(path):
+                    # Taken before any read, so a file changing meanwhile is picked up again by the next copy
+                    current = scan_manifest(path, self.settings, self.check)
+                    self.manifests.append((path, current))
+                    previous = self.db_manager.get_copy_manifest(path) if self.delta else None
+                if previous is not None:
+                    if self.base_id is None:
+                        self.base_id = previous[0]
+                    if not self.builder.add_path_changes(path, self.settings, previous[1], current):
+                        break
+                    continue
+                pinned = self.pinned_folders.get_bundle(path) if self.pinned_folders else None
+                if pinned is not None and self.builder.add_bundle(*pinned):
+                    self.files_done += pinned[1]
+                    self.check()
+                    continue
+                if not self.builder.add_path(path, self.settings):
+                    break
+        except DeadlineReached:
+            self.builder.stop(f"Processing time limit of {self.timeout:g}s reached.")
+        finally:
+            self.finished.set()
+        return self.builder
+
+    def on_plan(self, files_count):
+        self.files_total = files_count
+        self.counting_done = True
+
+    def on_section(self, file_path):
+        self.files_done += 1
+        self.check()
+
+    def check(self):
+        if self.on_check is not None:
+            self.on_check(self)
+        if self.cancel_reason is not None:
+            raise JobCancelled(self.cancel_reason)
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            raise DeadlineReached()
+        if self.on_progress is not None and now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.on_progress(self)
+
+    def count_files(self):
+        # Mirrors the choices run() makes per path
+        if self.finished.wait(COUNT_DELAY) or self.settings.assembly_mode == "priority":
+            return
+        try:
+            for path in self.file_paths:
+                previous = None
+                if self.delta and self.db_manager is not None and os.path.isdir(path):
+                    previous = self.db_manager.get_copy_manifest(path)
+                if previous is not None:
+                    # Only the changed files are read; reuses the run's manifest when it has been taken already
+                    current = dict(self.manifests).get(path)
+                    if current is None:
+                        current = scan_manifest(path, self.settings, self.stop_counting)
+                    self.files_total += sum(previous[1].get(file_path) != key for file_path, key in current.items())
+                    continue
+                pinned = self.pinned_folders.get_bundle(path) if self.pinned_folders else None
+                if pinned is not None:
+                    self.files_total += pinned[1]
+                    continue
+                for _ in iter_candidate_files(path, self.settings):
+                    self.stop_counting()
+                    self.files_total += 1
+        except JobCancelled:
+            return
+        self.counting_done = True
+
+    def stop_counting(self):
+        if self.finished.is_set():
+            raise JobCancelled("finished")
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def eta(self):
+        # Seconds left at the current file rate, or None while the total is still being counted
+        if not self.counting_done or not self.files_done:
+            return None
+        remaining = max(self.files_total - self.files_done, 0)
+        return self.elapsed() / self.files_done * remaining
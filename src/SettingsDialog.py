@@ -1,14 +1,16 @@
+import sys
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout,
                              QCheckBox, QLabel, QPushButton, QSpinBox, QTextEdit, QComboBox
                              )
 
-from utils import get_installed_ollama_models
-
 
 class SettingsDialog(QDialog):
-    def __init__(self, settings, parent=None):
+    def __init__(self, settings, parent=None, file_cache=None, summarizer=None, model_discovery=None):
         super().__init__(parent)
         self.settings = settings
+        self.file_cache = file_cache
+        self.summarizer = summarizer
+        self.model_discovery = model_discovery
         self.init_ui()
 
     def init_ui(self):
@@ -27,6 +29,15 @@ class SettingsDialog(QDialog):
         self.supported_extensions_edit.setPlainText(", ".join(self.settings.supported_extensions))
         layout.addWidget(self.supported_extensions_edit)
 
+        # Ignore rules
+        self.respect_ignore_files_cb = QCheckBox("Honour .gitignore and .ignore files")
+        self.respect_ignore_files_cb.setChecked(self.settings.respect_ignore_files)
+        layout.addWidget(self.respect_ignore_files_cb)
+        layout.addWidget(QLabel("Always exclude (gitignore patterns, comma-separated):"))
+        self.global_excludes_edit = QTextEdit()
+        self.global_excludes_edit.setPlainText(", ".join(self.settings.global_excludes))
+        layout.addWidget(self.global_excludes_edit)
+
         # Max file size
         size_layout = QHBoxLayout()
         size_layout.addWidget(QLabel("Max file size (MB):"))
@@ -36,6 +47,128 @@ class SettingsDialog(QDialog):
         size_layout.addWidget(self.max_file_size_spin)
         layout.addLayout(size_layout)
 
+        # Output size budget
+        output_size_layout = QHBoxLayout()
+        output_size_layout.addWidget(QLabel("Max clipboard output (MB, 0 = unlimited):"))
+        self.max_output_size_spin = QSpinBox()
+        self.max_output_size_spin.setRange(0, 4000)
+        self.max_output_size_spin.setValue(self.settings.max_output_size)
+        output_size_layout.addWidget(self.max_output_size_spin)
+        layout.addLayout(output_size_layout)
+
+        # Processing deadline
+        timeout_layout = QHBoxLayout()
+        timeout_layout.addWidget(QLabel("Processing time limit (s, 0 = unlimited):"))
+        self.processing_timeout_spin = QSpinBox()
+        self.processing_timeout_spin.setRange(0, 3600)
+        self.processing_timeout_spin.setValue(self.settings.processing_timeout)
+        timeout_layout.addWidget(self.processing_timeout_spin)
+        layout.addLayout(timeout_layout)
+
+        # Bundle assembly
+        assembly_layout = QHBoxLayout()
+        assembly_layout.addWidget(QLabel("Bundle assembly:"))
+        self.assembly_mode_combo = QComboBox()
+        self.assembly_mode_combo.addItem("All files, in folder order", "all")
+        self.assembly_mode_combo.addItem("Best files within a budget, duplicates removed", "priority")
+        self.assembly_mode_combo.setCurrentIndex(
+            max(self.assembly_mode_combo.findData(self.settings.assembly_mode), 0))
+        self.assembly_mode_combo.currentIndexChanged.connect(self.toggle_budget_tokens)
+        assembly_layout.addWidget(self.assembly_mode_combo)
+        layout.addLayout(assembly_layout)
+
+        budget_layout = QHBoxLayout()
+        self.budget_tokens_label = QLabel("Token budget (0 = max clipboard output):")
+        budget_layout.addWidget(self.budget_tokens_label)
+        self.budget_tokens_spin = QSpinBox()
+        self.budget_tokens_spin.setRange(0, 10000000)
+        self.budget_tokens_spin.setSingleStep(1000)
+        self.budget_tokens_spin.setValue(self.settings.budget_tokens)
+        budget_layout.addWidget(self.budget_tokens_spin)
+        layout.addLayout(budget_layout)
+        self.toggle_budget_tokens()
+
+        # Delta copies
+        self.delta_copies_cb = QCheckBox("Re-copying a folder gives only the files changed since its last copy")
+        self.delta_copies_cb.setChecked(self.settings.delta_copies)
+        layout.addWidget(self.delta_copies_cb)
+
+        # Parallel readers
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Parallel file readers:"))
+        self.read_workers_spin = QSpinBox()
+        self.read_workers_spin.setRange(1, 64)
+        self.read_workers_spin.setValue(self.settings.read_workers)
+        workers_layout.addWidget(self.read_workers_spin)
+        layout.addLayout(workers_layout)
+
+        # File content cache
+        cache_layout = QHBoxLayout()
+        cache_layout.addWidget(QLabel("File cache size (MB):"))
+        self.file_cache_size_spin = QSpinBox()
+        self.file_cache_size_spin.setRange(0, 16000)
+        self.file_cache_size_spin.setValue(self.settings.file_cache_size)
+        cache_layout.addWidget(self.file_cache_size_spin)
+        layout.addLayout(cache_layout)
+
+        disk_cache_layout = QHBoxLayout()
+        self.use_disk_cache_cb = QCheckBox("Keep file cache on disk (MB):")
+        self.use_disk_cache_cb.setChecked(self.settings.use_disk_cache)
+        self.use_disk_cache_cb.stateChanged.connect(self.toggle_disk_cache_size)
+        disk_cache_layout.addWidget(self.use_disk_cache_cb)
+        self.disk_cache_size_spin = QSpinBox()
+        self.disk_cache_size_spin.setRange(1, 64000)
+        self.disk_cache_size_spin.setValue(self.settings.disk_cache_size)
+        disk_cache_layout.addWidget(self.disk_cache_size_spin)
+        layout.addLayout(disk_cache_layout)
+
+        if self.file_cache is not None:
+            cache_stats_layout = QHBoxLayout()
+            self.cache_stats_label = QLabel()
+            cache_stats_layout.addWidget(self.cache_stats_label)
+            clear_cache_button = QPushButton("Clear Cache")
+            clear_cache_button.clicked.connect(self.clear_file_cache)
+            cache_stats_layout.addWidget(clear_cache_button)
+            layout.addLayout(cache_stats_layout)
+            self.update_cache_stats()
+
+        # History retention
+        history_layout = QHBoxLayout()
+        history_layout.addWidget(QLabel("Keep history up to (MB, 0 = unlimited):"))
+        self.history_max_size_spin = QSpinBox()
+        self.history_max_size_spin.setRange(0, 64000)
+        self.history_max_size_spin.setValue(self.settings.history_max_size)
+        history_layout.addWidget(self.history_max_size_spin)
+        history_layout.addWidget(QLabel("and days (0 = forever):"))
+        self.history_max_age_spin = QSpinBox()
+        self.history_max_age_spin.setRange(0, 3650)
+        self.history_max_age_spin.setValue(self.settings.history_max_age)
+        history_layout.addWidget(self.history_max_age_spin)
+        layout.addLayout(history_layout)
+
+        # Clipboard change detection
+        monitor_mode_layout = QHBoxLayout()
+        monitor_mode_layout.addWidget(QLabel("Clipboard detection:"))
+        self.monitor_mode_combo = QComboBox()
+        # macOS only notifies the active app of clipboard changes made elsewhere
+        notifications = "Change notifications (only while the app is active)" if sys.platform == "darwin" \
+            else "Change notifications"
+        self.monitor_mode_combo.addItem(notifications, "event")
+        self.monitor_mode_combo.addItem("Polling (every second)", "poll")
+        self.monitor_mode_combo.setCurrentIndex(max(self.monitor_mode_combo.findData(self.settings.monitor_mode), 0))
+        self.monitor_mode_combo.currentIndexChanged.connect(self.toggle_fallback_poll_interval)
+        monitor_mode_layout.addWidget(self.monitor_mode_combo)
+        layout.addLayout(monitor_mode_layout)
+
+        fallback_layout = QHBoxLayout()
+        self.fallback_poll_interval_label = QLabel("Fallback poll interval (s):")
+        fallback_layout.addWidget(self.fallback_poll_interval_label)
+        self.fallback_poll_interval_spin = QSpinBox()
+        self.fallback_poll_interval_spin.setRange(1, 60)
+        self.fallback_poll_interval_spin.setValue(self.settings.fallback_poll_interval)
+        fallback_layout.addWidget(self.fallback_poll_interval_spin)
+        layout.addLayout(fallback_layout)
+
         # Ollama settings
         self.use_ollama_cb = QCheckBox("Use Ollama for summarization")
         self.use_ollama_cb.setChecked(self.settings.use_ollama)
@@ -44,18 +177,32 @@ class SettingsDialog(QDialog):
         ollama_model_layout = QHBoxLayout()
         ollama_model_layout.addWidget(QLabel("Ollama Model:"))
         self.ollama_model_combo = QComboBox()
-        self.ollama_model_combo.addItems(self.settings.installed_models)
-        if self.settings.ollama_model in self.settings.installed_models:
-            self.ollama_model_combo.setCurrentText(self.settings.ollama_model)
-        elif self.settings.installed_models:
-            self.ollama_model_combo.setCurrentIndex(0)
+        self.set_ollama_models(self.settings.installed_models)
         ollama_model_layout.addWidget(self.ollama_model_combo)
         layout.addLayout(ollama_model_layout)
 
+        summary_workers_layout = QHBoxLayout()
+        summary_workers_layout.addWidget(QLabel("Concurrent summaries:"))
+        self.summary_workers_spin = QSpinBox()
+        self.summary_workers_spin.setRange(1, 8)
+        self.summary_workers_spin.setValue(self.settings.summary_workers)
+        summary_workers_layout.addWidget(self.summary_workers_spin)
+        layout.addLayout(summary_workers_layout)
+
+        self.summary_cache_label = QLabel()
+        layout.addWidget(self.summary_cache_label)
+        self.update_summary_cache_stats()
+
         # Refresh models button
-        refresh_button = QPushButton("Refresh Ollama Models")
-        refresh_button.clicked.connect(self.refresh_ollama_models)
-        layout.addWidget(refresh_button)
+        self.refresh_button = QPushButton("Refresh Ollama Models")
+        self.refresh_button.clicked.connect(self.refresh_ollama_models)
+        layout.addWidget(self.refresh_button)
+        if self.model_discovery is not None:
+            self.model_discovery.models_ready.connect(self.set_ollama_models)
+            self.model_discovery.finished.connect(self.on_discovery_finished)
+            self.refresh_ollama_models()  # the cached list is shown until Ollama answers
+        else:
+            self.refresh_button.setEnabled(False)
 
         # Save button
         self.save_button = QPushButton("Save")
@@ -66,29 +213,102 @@ class SettingsDialog(QDialog):
         self.setLayout(layout)
         self.setWindowTitle("Clipboard Monitor Settings")
         self.toggle_supported_extensions()
+        self.toggle_fallback_poll_interval()
+        self.toggle_disk_cache_size()
 
     def toggle_supported_extensions(self):
         enabled = not self.process_all_files_cb.isChecked()
         self.supported_extensions_label.setEnabled(enabled)
         self.supported_extensions_edit.setEnabled(enabled)
 
+    def toggle_budget_tokens(self):
+        enabled = self.assembly_mode_combo.currentData() == "priority"
+        self.budget_tokens_label.setEnabled(enabled)
+        self.budget_tokens_spin.setEnabled(enabled)
+
+    def toggle_fallback_poll_interval(self):
+        enabled = self.monitor_mode_combo.currentData() == "event"
+        self.fallback_poll_interval_label.setEnabled(enabled)
+        self.fallback_poll_interval_spin.setEnabled(enabled)
+
+    def toggle_disk_cache_size(self):
+        self.disk_cache_size_spin.setEnabled(self.use_disk_cache_cb.isChecked())
+
+    def update_cache_stats(self):
+        stats = self.file_cache.stats()
+        self.cache_stats_label.setText(
+            f"Cache: {stats['entries']} file(s), {stats['size'] / 1024 / 1024:.1f} MB in memory, "
+            f"{stats['hit_rate']:.0%} hit rate ({stats['hits']} memory / {stats['disk_hits']} disk hits, "
+            f"{stats['misses']} misses, {stats['evictions']} evictions)")
+
+    def update_summary_cache_stats(self):
+        entries, hits, seconds_saved = self.settings.db_manager.get_summary_cache_stats()
+        text = f"Summary cache: {entries} title(s), {int(hits)} hit(s) saving {seconds_saved:.0f}s of Ollama time"
+        if self.summarizer is not None:
+            text += f", {self.summarizer.stats()['cache_hit_rate']:.0%} hit rate this session"
+        self.summary_cache_label.setText(text)
+
+    def clear_file_cache(self):
+        self.file_cache.clear()
+        self.update_cache_stats()
+
     def refresh_ollama_models(self):
-        self.settings.installed_models = get_installed_ollama_models()
-        current_model = self.ollama_model_combo.currentText()
+        self.refresh_button.setEnabled(False)
+        self.refresh_button.setText("Refreshing Ollama Models...")
+        self.model_discovery.start()
+
+    def on_discovery_finished(self):
+        self.refresh_button.setEnabled(True)
+        self.refresh_button.setText("Refresh Ollama Models")
+
+    def done(self, result):
+        if self.model_discovery is not None:
+            # The discovery object outlives the dialog; later answers must not reach a closed one
+            self.model_discovery.models_ready.disconnect(self.set_ollama_models)
+            self.model_discovery.finished.disconnect(self.on_discovery_finished)
+            self.model_discovery = None
+        super().done(result)
+
+    def set_ollama_models(self, models):
+        current_model = self.ollama_model_combo.currentText() or self.settings.ollama_model
         self.ollama_model_combo.clear()
-        self.ollama_model_combo.addItems(self.settings.installed_models)
-        if current_model in self.settings.installed_models:
+        self.ollama_model_combo.addItems(models)
+        if current_model in models:
+            self.ollama_model_combo.setCurrentText(current_model)
+        elif current_model:
+            # Keep the configured model selectable while Ollama is unreachable or lists it differently
+            self.ollama_model_combo.addItem(current_model)
             self.ollama_model_combo.setCurrentText(current_model)
-        elif self.settings.installed_models:
+        elif models:
             self.ollama_model_combo.setCurrentIndex(0)
 
     def save_settings(self):
         self.settings.process_all_files = self.process_all_files_cb.isChecked()
         self.settings.max_file_size = self.max_file_size_spin.value()
+        self.settings.respect_ignore_files = self.respect_ignore_files_cb.isChecked()
+        patterns = [pattern.strip() for pattern in self.global_excludes_edit.toPlainText().split(',')]
+        self.settings.global_excludes = [pattern for pattern in patterns if pattern]
+        self.settings.max_output_size = self.max_output_size_spin.value()
+        self.settings.read_workers = self.read_workers_spin.value()
+        self.settings.processing_timeout = self.processing_timeout_spin.value()
+        self.settings.assembly_mode = self.assembly_mode_combo.currentData()
+        self.settings.budget_tokens = self.budget_tokens_spin.value()
+        self.settings.delta_copies = self.delta_copies_cb.isChecked()
+        self.settings.file_cache_size = self.file_cache_size_spin.value()
+        self.settings.use_disk_cache = self.use_disk_cache_cb.isChecked()
+        self.settings.disk_cache_size = self.disk_cache_size_spin.value()
         if not self.settings.process_all_files:
             extensions = [ext.strip() for ext in self.supported_extensions_edit.toPlainText().split(',')]
             self.settings.supported_extensions = [ext if ext.startswith('.') else f'.{ext}' for ext in extensions]
+        self.settings.monitor_mode = self.monitor_mode_combo.currentData()
+        self.settings.fallback_poll_interval = self.fallback_poll_interval_spin.value()
+        self.settings.history_max_size = self.history_max_size_spin.value()
+        self.settings.history_max_age = self.history_max_age_spin.value()
         self.settings.use_ollama = self.use_ollama_cb.isChecked()
+        if self.ollama_model_combo.currentText() != self.settings.ollama_model:
+            # Titles from the previous model are not reused
+            self.settings.db_manager.clear_summary_cache(keep_model=self.ollama_model_combo.currentText())
         self.settings.ollama_model = self.ollama_model_combo.currentText()
+        self.settings.summary_workers = self.summary_workers_spin.value()
         self.settings.save()
         self.accept()
@@ -0,0 +1,99 @@
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, QPushButton,
+                             QSpinBox, QLabel, QFileDialog, QHeaderView)
+
+from Instrumentation import instrumentation
+
+REFRESH_INTERVAL_MS = 1000
+COLUMNS = ("Stage", "Calls", "p50 ms", "p95 ms", "Max ms", "Total s", "Size (MB)", "Files/s p50")
+
+
+class StatsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("Clipboard Monitor Stats")
+        self.resize(760, 420)
+        layout = QVBoxLayout()
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+
+        profile_layout = QHBoxLayout()
+        profile_layout.addWidget(QLabel("Profile the next"))
+        self.profile_count_spin = QSpinBox()
+        self.profile_count_spin.setRange(1, 50)
+        self.profile_count_spin.setValue(3)
+        profile_layout.addWidget(self.profile_count_spin)
+        profile_layout.addWidget(QLabel("copies"))
+        profile_button = QPushButton("Start Profiling")
+        profile_button.clicked.connect(self.start_profiling)
+        profile_layout.addWidget(profile_button)
+        profile_layout.addStretch()
+        layout.addLayout(profile_layout)
+
+        self.profile_label = QLabel()
+        self.profile_label.setWordWrap(True)
+        layout.addWidget(self.profile_label)
+
+        buttons_layout = QHBoxLayout()
+        export_button = QPushButton("Export JSON...")
+        export_button.clicked.connect(self.export_json)
+        buttons_layout.addWidget(export_button)
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        buttons_layout.addWidget(reset_button)
+        buttons_layout.addStretch()
+        layout.addLayout(buttons_layout)
+
+        self.setLayout(layout)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(REFRESH_INTERVAL_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+        self.refresh()
+
+    def refresh(self):
+        snapshot = instrumentation.snapshot()
+        stages = sorted(snapshot['stages'].items())
+        self.table.setRowCount(len(stages))
+        for row, (name, stage) in enumerate(stages):
+            durations = stage['duration_ms']
+            files_per_second = stage['files_per_second']
+            values = (
+                name,
+                str(stage['calls']),
+                f"{durations.get('p50', 0):.2f}",
+                f"{durations.get('p95', 0):.2f}",
+                f"{durations.get('max', 0):.2f}",
+                f"{stage['total_seconds']:.2f}",
+                f"{stage['total_size'] / 1024 / 1024:.2f}" if stage['total_size'] else "",
+                f"{files_per_second['p50']:.0f}" if files_per_second['count'] else "",
+            )
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+        pending = instrumentation.profiles_requested
+        text = f"{pending} profiled copy(ies) pending. " if pending else ""
+        if snapshot['profiles']:
+            text += f"Last profile: {snapshot['profiles'][-1]} (open with python -m pstats or snakeviz)"
+        self.profile_label.setText(text)
+
+    def start_profiling(self):
+        instrumentation.request_profiles(self.profile_count_spin.value())
+        self.refresh()
+
+    def export_json(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Stats", "clipminder-stats.json", "JSON (*.json)")
+        if path:
+            instrumentation.export_json(path)
+
+    def reset(self):
+        instrumentation.reset()
+        self.refresh()
@@ -0,0 +1,161 @@
+import itertools
+import time
+from collections import deque
+from queue import PriorityQueue
+from threading import Lock, Thread
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from utils import summarize_with_ollama
+
+LATENCY_WINDOW = 100  # recent jobs kept for the latency stats
+SAMPLE_BYTES = 1024 * 1024  # head of the stored bundle the prompt is shaped from
+
+
+class SummarizationScheduler(QObject):
+    # A fixed number of summarization workers fed from a priority queue, newest history item first.
+    # Submitting an item that is already queued only updates its model; items pruned from history
+    # before their turn are dropped without contacting Ollama, and content already summarized with the
+    # same model is answered from the summary cache.
+    summary_ready = pyqtSignal(int, str)  # item_id, summary
+    queue_changed = pyqtSignal(int)  # jobs queued or running
+
+    def __init__(self, db_manager, workers=1):
+        super().__init__()
+        self.db_manager = db_manager
+        self.queue = PriorityQueue()
+        self.pending = {}  # item_id -> (model, submitted_at), for jobs not yet picked up
+        self.running = 0
+        self.lock = Lock()
+        self.sequence = itertools.count()
+        self.stopped = False
+        self.completed = 0
+        self.cancelled = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.seconds_saved = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)  # (seconds queued, seconds generating)
+        self.session = None
+        self.workers = [Thread(target=self.run_worker, name=f"summarizer-{i}", daemon=True)
+                        for i in range(max(workers, 1))]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, item_id, model):
+        if self.stopped or self.answer_from_cache(item_id, model):
+            return
+        with self.lock:
+            if self.stopped:
+                return
+            coalesced = item_id in self.pending
+            self.pending[item_id] = (model, time.monotonic())
+            if not coalesced:
+                # Higher ids are newer; the sequence number keeps equal priorities FIFO
+                self.queue.put((-item_id, next(self.sequence), item_id))
+        self.queue_changed.emit(self.depth())
+
+    def answer_from_cache(self, item_id, model, count_miss=True):
+        cached = self.db_manager.get_cached_summary(item_id, model)
+        with self.lock:
+            if cached is None:
+                self.cache_misses += count_miss
+                return False
+            self.cache_hits += 1
+            self.cache_misses -= not count_miss
+            self.seconds_saved += cached[1] or 0.0
+        if not self.stopped:
+            self.summary_ready.emit(item_id, cached[0])
+        return True
+
+    def depth(self):
+        with self.lock:
+            return len(self.pending) + self.running
+
+    def get_session(self):
+        # Created with the first job so requests is never imported while summarization is unused.
+        # One keep-alive connection per worker instead of a new connection per request.
+        with self.lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self.session = requests.Session()
+                self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=len(self.workers)))
+            return self.session
+
+    def run_worker(self):
+        while True:
+            _, _, item_id = self.queue.get()
+            if item_id is None:
+                return
+            with self.lock:
+                job = self.pending.pop(item_id, None)
+                if job is None:
+                    continue  # cancelled while queued
+                self.running += 1
+            try:
+                self.run_job(item_id, *job)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                if not self.stopped:
+                    self.queue_changed.emit(self.depth())
+
+    def run_job(self, item_id, model, submitted_at):
+        started = time.monotonic()
+        try:
+            sample = self.db_manager.get_history_item_sample(item_id, SAMPLE_BYTES)
+            if sample is None:
+                # Pruned from history before it could be summarized
+                with self.lock:
+                    self.cancelled += 1
+                return
+            # Identical content queued under another item may have been summarized meanwhile
+            if self.answer_from_cache(item_id, model, count_miss=False):
+                return
+            summary = summarize_with_ollama(sample[0], model, session=self.get_session(), file_names=sample[1])
+        except Exception as e:
+            summary = f"Error in summarization: {str(e)}"
+            print(summary)
+        if self.stopped:
+            return
+        finished = time.monotonic()
+        if not summary.startswith("Error") and summary != "Unable to generate summary":
+            self.db_manager.set_cached_summary(item_id, model, summary, finished - started)
+        with self.lock:
+            self.completed += 1
+            self.latencies.append((started - submitted_at, finished - started))
+        print(f"Summarized item {item_id} in {finished - started:.2f}s after {started - submitted_at:.2f}s "
+              f"queued: {summary[:100]}")
+        self.summary_ready.emit(item_id, summary)
+
+    def stats(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            stats = {
+                'queued': len(self.pending),
+                'running': self.running,
+                'completed': self.completed,
+                'cancelled': self.cancelled,
+                'cache_hits': self.cache_hits,
+                'cache_hit_rate': self.cache_hits / max(self.cache_hits + self.cache_misses, 1),
+                'seconds_saved': self.seconds_saved,
+            }
+        for index, name in enumerate(('wait', 'run')):
+            values = sorted(latency[index] for latency in latencies)
+            stats[f'{name}_mean'] = sum(values) / len(values) if values else 0.0
+            stats[f'{name}_p95'] = values[min(int(len(values) * 0.95), len(values) - 1)] if values else 0.0
+        return stats
+
+    def shutdown(self):
+        # Drops queued jobs and returns without waiting for generations in flight; closing the session
+        # aborts their streams, and the daemon workers exit with the process
+        with self.lock:
+            self.stopped = True
+            self.cancelled += len(self.pending)
+            self.pending.clear()
+        for _ in self.workers:
+            self.queue.put((float('inf'), next(self.sequence), None))
+        with self.lock:
+            if self.session is not None:
+                self.session.close()
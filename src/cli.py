@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import time
+from DatabaseManager import DatabaseManager
+from FileContentCache import FileContentCache
+from processing import BundleBuilder, priority_budget
+from Settings import Settings
+
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+
+def iter_listed_paths(source, separator):
+    # Paths are handed on as they are read, so a long `find` listing starts streaming right away
+    pending = ""
+    while chunk := source.read(64 * 1024):
+        pending += chunk
+        *paths, pending = pending.split(separator)
+        yield from (path for path in paths if path)
+    if pending.strip(separator):
+        yield pending
+
+
+def iter_input_paths(args):
+    yield from args.paths
+    if args.files_from:
+        separator = "\0" if args.null else "\n"
+        if args.files_from == "-":
+            yield from iter_listed_paths(sys.stdin, separator)
+        else:
+            with open(args.files_from, encoding="utf-8", newline="") as source:
+                yield from iter_listed_paths(source, separator)
+
+
+def open_output(path):
+    if path and path != "-":
+        return open(path, "w", encoding="utf-8", newline="", buffering=OUTPUT_BUFFER_SIZE)
+    sys.stdout.reconfigure(encoding="utf-8", newline="")
+    return sys.stdout
+
+
+def build_bundle(paths, settings, output, cache=None):
+    builder = BundleBuilder(settings.max_output_size * 1024 * 1024, cache, sink=output)
+    missing = []
+    existing = []
+    for path in paths:
+        path = os.path.abspath(os.path.expanduser(path.rstrip("\r")))
+        if not os.path.exists(path):
+            missing.append(path)
+        elif settings.assembly_mode == "priority":
+            existing.append(path)  # ranked together once the list is complete
+        elif not builder.add_path(path, settings):
+            break
+    if existing:
+        builder.add_paths_by_priority(existing, settings, priority_budget(settings))
+    return builder, missing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="clipminder-cli",
+        description="Bundle files and folders like a ClipMinder copy, without Qt or a clipboard. "
+                    "Filters and limits come from the ClipMinder settings in the database.")
+    parser.add_argument("paths", nargs="*", help="files or folders to bundle, in order")
+    parser.add_argument("--files-from", metavar="FILE", help="read more paths from FILE, one per line ('-' for stdin)")
+    parser.add_argument("-0", "--null", action="store_true", help="paths from --files-from are NUL-separated")
+    parser.add_argument("-o", "--output", help="write the bundle to this file instead of stdout")
+    parser.add_argument("--db", help="path of the SQLite database (default: per-user data directory, "
+                                     "or $CLIPMINDER_DB)")
+    parser.add_argument("--max-output-size", type=int, metavar="MB", help="override the output size limit "
+                                                                          "(0 for unlimited)")
+    parser.add_argument("--workers", type=int, help="override the number of parallel file readers")
+    parser.add_argument("--mode", choices=("all", "priority"), help="override the assembly mode: every file in "
+                                                                    "folder order, or the best files within a budget")
+    parser.add_argument("--budget-tokens", type=int, metavar="N", help="override the token budget of the priority "
+                                                                       "mode (0 for the output size limit)")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="read and fill the on-disk file content cache; new contents of a path are held in "
+                             "memory until the path is done")
+    parser.add_argument("--stats", action="store_true", help="print counts and timing to stderr")
+    args = parser.parse_args(argv)
+    if not args.paths and not args.files_from:
+        args.files_from = "-"
+
+    started = time.perf_counter()
+    db_manager = DatabaseManager(args.db)
+    try:
+        settings = Settings(db_manager)
+        if args.max_output_size is not None:
+            settings.max_output_size = args.max_output_size
+        if args.workers is not None:
+            settings.read_workers = max(args.workers, 1)
+        if args.mode is not None:
+            settings.assembly_mode = args.mode
+        if args.budget_tokens is not None:
+            settings.budget_tokens = args.budget_tokens
+        # No in-memory tier: every file is read once, and the bundle never stays in memory as a whole
+        cache = FileContentCache(db_manager, 0, True, settings.disk_cache_size * 1024 * 1024) \
+            if args.use_cache else None
+
+        output = open_output(args.output)
+        try:
+            builder, missing = build_bundle(iter_input_paths(args), settings, output, cache)
+        finally:
+            if output is sys.stdout:
+                output.flush()
+            else:
+                output.close()
+    finally:
+        db_manager.close()
+
+    for path in missing:
+        print(f"Skipped missing path: {path}", file=sys.stderr)
+    if builder.truncated:
+        print(f"Output size limit of {settings.max_output_size} MB reached; remaining files were skipped",
+              file=sys.stderr)
+    if args.stats:
+        print(f"files={builder.files_count} lines={builder.lines_count} chars={builder.size} "
+              f"seconds={time.perf_counter() - started:.3f}", file=sys.stderr)
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except BrokenPipeError:
+        # e.g. piped into head; keep the interpreter from complaining while flushing stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
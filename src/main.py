@@ -1,13 +1,37 @@
-from PyQt6.QtWidgets import QApplication
-from ClipboardMonitorApp import ClipboardMonitorApp
-import sys
-import warnings
+import time
+
+STARTED = time.perf_counter()  # before the Qt and application imports, which are part of startup
+
+from PyQt6.QtCore import QTimer  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+from ClipboardMonitorApp import ClipboardMonitorApp  # noqa: E402
+import argparse  # noqa: E402
+import sys  # noqa: E402
+import warnings  # noqa: E402
 
 # Suppress DeprecationWarning for pkg_resources
 warnings.filterwarnings("ignore", category=DeprecationWarning, module="pkg_resources")
 
+
+def report_startup(clipboard_monitor, quit_after):
+    # Runs on the first event loop iteration, once the tray icon has been shown
+    elapsed_ms = (time.perf_counter() - STARTED) * 1000
+    print(f"startup_ms={elapsed_ms:.1f} requests_imported={'requests' in sys.modules}", flush=True)
+    if quit_after:
+        clipboard_monitor.quit_app()
+
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    clipboard_monitor = ClipboardMonitorApp()
+    parser = argparse.ArgumentParser(prog="ClipMinder")
+    parser.add_argument("--db", help="path of the SQLite database (default: per-user data directory, "
+                                     "or $CLIPMINDER_DB)")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="print the time from launch to tray icon shown")
+    parser.add_argument("--quit-after-startup", action="store_true", help=argparse.SUPPRESS)
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    clipboard_monitor = ClipboardMonitorApp(args.db)
     app.setQuitOnLastWindowClosed(False)
+    if args.startup_time or args.quit_after_startup:
+        QTimer.singleShot(0, lambda: report_startup(clipboard_monitor, args.quit_after_startup))
     sys.exit(app.exec())
@@ -0,0 +1,741 @@
+import codecs
+import hashlib
+import io
+import math
+import mimetypes
+import mmap
+import os
+import posixpath
+import tarfile
+import time
+import zipfile
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from IgnoreRules import IgnoreRules
+from Instrumentation import instrumentation
+
+SNIFF_SIZE = 8192  # bytes inspected to tell text from binary before a full read
+DECODE_CHUNK_SIZE = 1024 * 1024
+COUNT_CHUNK_SIZE = 16 * 1024 * 1024
+LARGE_FILE_THRESHOLD = 16 * 1024 * 1024  # files at least this big are memory-mapped and decoded into the bundle
+ASCII_COMPATIBLE_ENCODINGS = ('utf-8', 'utf-8-sig', 'cp1252')
+FALLBACK_ENCODINGS = ('utf-8', 'cp1252')
+BOMS = ((codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'), (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+TEXT_CONTROL_BYTES = frozenset(b'\t\n\r\f\b\x1b')
+BINARY_EXTENSION_THRESHOLD = 8  # binary sniffs of one extension in one directory before it is skipped unread
+EXTENSION_KINDS_MAX_ENTRIES = 4096  # what was learned is forgotten past this many (directory, extension) pairs
+SECTION_SEPARATOR = "\n\n"
+READ_BATCH_SIZE = 16  # files per pool task
+READ_AHEAD_PER_WORKER = 2  # bounded number of in-flight batches per worker thread
+CHARS_PER_TOKEN = 3  # conservative for source code
+SCAN_CHECK_INTERVAL = 256  # candidates ranked between on_scan() calls
+OMITTED_HEADER_MAX_LINES = 60
+OMITTED_NAMES_PER_DIR = 8
+PRIORITY_HEADER_RESERVE = 8192  # characters of the budget kept for the header
+EXTENSION_PRIORITY = {
+    **dict.fromkeys(('.py', '.js', '.jsx', '.ts', '.tsx', '.go', '.rs', '.java', '.kt', '.c', '.h', '.cc', '.cpp',
+                     '.hpp', '.cs', '.rb', '.php', '.swift', '.m', '.scala', '.sh', '.bash', '.zsh', '.sql'), 2),
+    **dict.fromkeys(('.md', '.rst', '.txt', '.toml', '.yaml', '.yml', '.json', '.ini', '.cfg', '.xml', '.html',
+                     '.css'), 1),
+    **dict.fromkeys(('.lock', '.map', '.log', '.csv', '.tsv', '.svg'), -2),
+}
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+LOCK_FILE_NAMES = frozenset(('package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'cargo.lock',
+                             'pipfile.lock', 'composer.lock', 'go.sum'))
+
+_extension_kinds = {}  # (directory, extension) -> [binary count, text count] from prefix sniffing
+
+
+def is_probably_text_file(file_path):
+    mime_type, _ = mimetypes.guess_type(file_path)
+    return mime_type and mime_type.startswith('text/')
+
+
+def sniff_encoding(prefix, at_eof):
+    # Classifies a file from its first bytes: returns the encoding to decode it with, or None for binary data
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    if b'\x00' in prefix:
+        return None
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final=at_eof)
+        except UnicodeDecodeError:
+            continue
+        if encoding != FALLBACK_ENCODINGS[0]:
+            # Single-byte codepages accept almost anything, so also require text-like control characters
+            control_bytes = sum(1 for byte in prefix if byte < 0x20 and byte not in TEXT_CONTROL_BYTES)
+            if control_bytes > len(prefix) * 0.1:
+                return None
+        return encoding
+    return None
+
+
+def extension_kind_key(file_path):
+    directory, name = os.path.split(file_path)
+    return directory, os.path.splitext(name)[1].lower()
+
+
+def is_known_binary_extension(file_path):
+    # Extensions only skip the prefix sniff once they have repeatedly sniffed as binary, and never as text, in the
+    # same directory: a folder of .ts videos says nothing about the TypeScript sources next to it
+    counts = _extension_kinds.get(extension_kind_key(file_path))
+    return (counts is not None and counts[1] == 0 and counts[0] >= BINARY_EXTENSION_THRESHOLD
+            and not is_probably_text_file(file_path))
+
+
+def record_extension_kind(file_path, is_binary):
+    key = extension_kind_key(file_path)
+    if key[1]:
+        if key not in _extension_kinds and len(_extension_kinds) >= EXTENSION_KINDS_MAX_ENTRIES:
+            _extension_kinds.clear()
+        counts = _extension_kinds.setdefault(key, [0, 0])
+        counts[0 if is_binary else 1] += 1
+
+
+def decode_file(file, prefix, encoding):
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), translate=True)
+    parts = [decoder.decode(prefix)]
+    file.seek(len(prefix))
+    while chunk := file.read(DECODE_CHUNK_SIZE):
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b'', final=True))
+    return "".join(parts)
+
+
+def read_text_file(file_path):
+    with open(file_path, 'rb') as file:
+        return read_text_stream(file, file_path)
+
+
+def read_text_stream(file, file_path):
+    # Returns the decoded content of a seekable binary file, or None when it is binary or no candidate encoding fits
+    prefix = file.read(SNIFF_SIZE)
+    encoding = sniff_encoding(prefix, at_eof=len(prefix) < SNIFF_SIZE)
+    record_extension_kind(file_path, encoding is None)
+    if encoding is None:
+        return None
+    encodings = [encoding] + [fallback for fallback in FALLBACK_ENCODINGS if fallback != encoding]
+    for candidate in encodings:
+        try:
+            return decode_file(file, prefix, candidate)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+class MappedTextFile:
+    # Content of a large file that is decoded from a memory map only while it is being written into the
+    # bundle. len() is the byte size, an upper bound of the decoded length for ASCII-compatible encodings.
+    def __init__(self, file_path, encoding, size):
+        self.file_path = file_path
+        self.encoding = encoding
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def iter_chunks(self):
+        # Errors are replaced rather than raised: the prefix was validated, and earlier chunks are already out
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(self.encoding)(errors='replace'),
+                                               translate=True)
+        with open(self.file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(0, len(mapped), DECODE_CHUNK_SIZE):
+                yield decoder.decode(mapped[offset:offset + DECODE_CHUNK_SIZE])
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+
+
+def iter_content_chunks(content):
+    if isinstance(content, MappedTextFile):
+        yield from content.iter_chunks()
+    else:
+        yield content
+
+
+def count_lines_mapped(mapped):
+    # Line count of the decoded text (universal newlines) computed on raw bytes of an ASCII-compatible encoding
+    newlines = carriage_returns = crlf = 0
+    for offset in range(0, len(mapped), COUNT_CHUNK_SIZE):
+        chunk = mapped[offset:offset + COUNT_CHUNK_SIZE]
+        newlines += chunk.count(b'\n')
+        if b'\r' in chunk:
+            carriage_returns += chunk.count(b'\r')
+            crlf += chunk.count(b'\r\n')
+            if chunk.endswith(b'\r') and mapped[offset + COUNT_CHUNK_SIZE:offset + COUNT_CHUNK_SIZE + 1] == b'\n':
+                crlf += 1
+    return newlines + carriage_returns - crlf + 1
+
+
+def read_large_text_file(file_path, size):
+    # Returns (MappedTextFile, line_count), None for binary data, or False when the encoding needs a full decode
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        encoding = sniff_encoding(mapped[:SNIFF_SIZE], at_eof=size <= SNIFF_SIZE)
+        record_extension_kind(file_path, encoding is None)
+        if encoding is None:
+            return None
+        if encoding not in ASCII_COMPATIBLE_ENCODINGS:
+            return False
+        return MappedTextFile(file_path, encoding, size), count_lines_mapped(mapped)
+
+
+def too_large_message(file_path, max_file_size):
+    return f"File {file_path} is too large (>{max_file_size / 1024 / 1024:.2f} MB). Skipping.\n"
+
+
+def get_file_content(file_path, max_file_size, cache=None):
+    stat = os.stat(file_path)
+    if stat.st_size > max_file_size:
+        return too_large_message(file_path, max_file_size), 0
+
+    not_text_message = f"File {file_path} is not a text file or uses an unsupported encoding. Skipping.\n"
+    if stat.st_size >= LARGE_FILE_THRESHOLD:
+        if is_known_binary_extension(file_path):
+            return not_text_message, 0
+        try:
+            result = read_large_text_file(file_path, stat.st_size)
+        except Exception as e:
+            return f"Error reading file {file_path}: {str(e)}\n", 0
+        if result is None:
+            return not_text_message, 0
+        if result:
+            return result
+
+    if cache is not None:
+        cached = cache.get(file_path, stat)
+        if cached is not None:
+            return cached
+
+    if is_known_binary_extension(file_path):
+        return not_text_message, 0
+    try:
+        content = read_text_file(file_path)
+    except Exception as e:
+        return f"Error reading file {file_path}: {str(e)}\n", 0
+    if content is None:
+        return not_text_message, 0
+    line_count = content.count('\n') + 1
+
+    if cache is not None:
+        cache.put(file_path, stat, content, line_count)
+    return content, line_count
+
+
+def walk_files(top, directories=None, rules=None):
+    # scandir-based equivalent of os.walk(top) yielding (name, path) for files in the same order:
+    # a directory's files first, then its subdirectories depth first; symlinked directories are not followed.
+    # Visited directories are appended to `directories` when a list is given. With IgnoreRules, ignored
+    # directories are pruned before they are listed.
+    stack = [(top, rules.root_scope(top) if rules is not None else None)]
+    while stack:
+        root, scope = stack.pop()
+        if directories is not None:
+            directories.append(root)
+        files = []
+        dirs = []
+        try:
+            with os.scandir(root) as iterator:
+                entries = list(iterator)
+        except OSError:
+            continue
+        if rules is not None:
+            scope = rules.enter(root, scope, {entry.name for entry in entries})
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir and entry.is_symlink():
+                continue
+            if rules is not None and rules.is_ignored(scope, entry.path, is_dir):
+                continue
+            if is_dir:
+                dirs.append((entry.path, scope))
+            else:
+                files.append((entry.name, entry.path))
+        yield from files
+        stack.extend(reversed(dirs))
+
+
+def iter_candidate_files(path, settings):
+    rules = IgnoreRules.from_settings(settings)
+    if os.path.isfile(path):
+        if rules.is_supported(path):
+            yield os.path.basename(path), path
+    elif os.path.isdir(path):
+        for file, file_path in walk_files(path, rules=rules):
+            if rules.is_supported(file_path):
+                yield file, file_path
+
+
+def file_fingerprint(stat):
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def scan_manifest(path, settings, on_scan=None):
+    # {file_path: fingerprint} of the candidate files of a copied path, in walk order; a walk plus one stat each
+    manifest = {}
+    for _, file_path in iter_candidate_files(path, settings):
+        try:
+            manifest[file_path] = file_fingerprint(os.stat(file_path))
+        except OSError:
+            continue
+        if on_scan is not None and len(manifest) % SCAN_CHECK_INTERVAL == 0:
+            on_scan()
+    return manifest
+
+
+def is_archive(file_path):
+    return file_path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def read_zip_member(archive, info, limit):
+    with archive.open(info) as member:
+        return member.read(limit)
+
+
+def iter_zip_members(archive_path):
+    # Yields (name, size from the header, read(limit)) per file member
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size, lambda limit, info=info: read_zip_member(archive, info, limit)
+
+
+def iter_tar_members(archive_path):
+    # Stream mode: one sequential pass, also through gzip/bz2/xz, and members are read before moving on
+    with tarfile.open(archive_path, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, member.size, lambda limit, member=member: archive.extractfile(member).read(limit)
+
+
+def read_archive_member(member_path, size, read, max_file_size):
+    if size > max_file_size:
+        return too_large_message(member_path, max_file_size), 0
+    not_text_message = f"File {member_path} is not a text file or uses an unsupported encoding. Skipping.\n"
+    if is_known_binary_extension(member_path):
+        return not_text_message, 0
+    try:
+        data = read(max_file_size + 1)  # the size in the header is not trusted
+        if len(data) > max_file_size:
+            return too_large_message(member_path, max_file_size), 0
+        content = read_text_stream(io.BytesIO(data), member_path)
+    except Exception as e:
+        return f"Error reading file {member_path}: {str(e)}\n", 0
+    if content is None:
+        return not_text_message, 0
+    return content, content.count('\n') + 1
+
+
+def iter_archive_sections(archive_path, settings):
+    # Members of a zip or tar archive as if the archive were a directory, read in archive order straight from the
+    # archive without extracting anything to disk. Extension, size and global exclude filters apply to members
+    # as to files; ignore files inside the archive are not read, since a stream can list them after the files.
+    rules = IgnoreRules.from_settings(settings)
+    scope = rules.root_scope(archive_path)
+    max_file_size = settings.max_file_size * 1024 * 1024
+    ignored_dirs = {}
+    if archive_path.lower().endswith('.zip'):
+        members = iter_zip_members(archive_path)
+    else:
+        members = iter_tar_members(archive_path)
+    try:
+        for name, size, read in members:
+            name = posixpath.normpath(name).lstrip('/')
+            if name.startswith('..'):
+                continue
+            parts = name.split('/')
+            member_path = os.path.join(archive_path, *parts)
+            if not rules.is_supported(member_path):
+                continue
+            ignored = False
+            for depth in range(1, len(parts)):
+                directory = os.path.join(archive_path, *parts[:depth])
+                if directory not in ignored_dirs:
+                    ignored_dirs[directory] = rules.is_ignored(scope, directory, True)
+                if ignored_dirs[directory]:
+                    ignored = True
+                    break
+            if ignored or rules.is_ignored(scope, member_path, False):
+                continue
+            yield parts[-1], member_path, read_archive_member(member_path, size, read, max_file_size)
+    except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError) as e:
+        yield os.path.basename(archive_path), archive_path, (f"Error reading archive {archive_path}: {str(e)}\n", 0)
+    finally:
+        members.close()
+
+
+def read_file_batch(batch, max_file_size, cache, expand_archives=False):
+    # With expand_archives, archives are left unread (None) for the caller to expand
+    with instrumentation.measure("read") as measurement:
+        results = [None if expand_archives and is_archive(file_path) else
+                   get_file_content(file_path, max_file_size, cache) for _, file_path in batch]
+        measurement.files = len(batch)
+        measurement.size = sum(len(result[0]) for result in results if result is not None)
+    return results
+
+
+def read_files(candidates, max_file_size, workers, cache=None, expand_archives=False):
+    # Reads run on a thread pool while the walk keeps producing candidates; results come back in walk order.
+    # Files are handed out in small batches so per-task overhead stays low on trees of tiny files.
+    if workers <= 1:
+        for file, file_path in candidates:
+            yield file, file_path, read_file_batch(((file, file_path),), max_file_size, cache, expand_archives)[0]
+        return
+
+    candidates = iter(candidates)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        while True:
+            batch = list(islice(candidates, READ_BATCH_SIZE))
+            if batch:
+                pending.append((batch, executor.submit(read_file_batch, batch, max_file_size, cache,
+                                                       expand_archives)))
+            if pending and (not batch or len(pending) >= workers * READ_AHEAD_PER_WORKER):
+                done_batch, future = pending.popleft()
+                for (file, file_path), result in zip(done_batch, future.result()):
+                    yield file, file_path, result
+            if not batch and not pending:
+                break
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_path_sections(path, settings, cache=None):
+    # A copied archive is always opened; archives inside a folder only when they pass the extension filter
+    if os.path.isfile(path) and is_archive(path):
+        yield from instrumentation.iterate("archive", iter_archive_sections(path, settings))
+        return
+    yield from iter_file_sections(instrumentation.iterate("walk", iter_candidate_files(path, settings)), settings,
+                                  cache)
+
+
+def iter_file_sections(candidates, settings, cache=None):
+    # Reads (file, file_path) candidates in order, expanding the archives among them into their members
+    sections = read_files(candidates, settings.max_file_size * 1024 * 1024, settings.read_workers, cache,
+                          expand_archives=True)
+    try:
+        for file, file_path, result in sections:
+            if result is None:
+                yield from instrumentation.iterate("archive", iter_archive_sections(file_path, settings))
+            else:
+                yield file, file_path, result
+    finally:
+        sections.close()
+
+
+def section_header(file, file_path):
+    return f"File: {file}\nPath: {file_path}\n"
+
+
+def score_candidate(rel_path, size, mtime, now):
+    # Higher is better: shallow, recently modified, small source files first; lockfiles, maps and data last
+    name = os.path.basename(rel_path).lower()
+    if name.startswith('readme'):
+        priority = 3
+    elif name in LOCK_FILE_NAMES or name.endswith(('.min.js', '.min.css')):
+        priority = -3
+    else:
+        priority = EXTENSION_PRIORITY.get(os.path.splitext(name)[1], 0)
+    age_days = max(now - mtime, 0) / 86400
+    return priority * 2 - rel_path.count(os.sep) + 2 / (1 + age_days) - math.log2(max(size, 1024) / 1024) / 2
+
+
+def content_digest(content):
+    return hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+def priority_budget(settings):
+    # Characters for the priority assembly mode: the token budget if one is set, else the output size limit
+    if settings.budget_tokens:
+        return settings.budget_tokens * CHARS_PER_TOKEN
+    return settings.max_output_size * 1024 * 1024
+
+
+class Candidate:
+    def __init__(self, index, root_index, rel_path, file, file_path, size, score):
+        self.index = index  # walk order
+        self.root_index = root_index
+        self.rel_path = rel_path
+        self.file = file
+        self.file_path = file_path
+        self.size = size
+        self.score = score
+
+
+class TreeNode:
+    def __init__(self):
+        self.files = []
+        self.dirs = {}
+        self.total = 0
+        self.omitted = 0
+
+
+def format_omitted_tree(paths, candidates, omitted):
+    # Omitted files per copied path, with directories left out entirely collapsed to one line
+    roots = [TreeNode() for _ in paths]
+    for candidate in candidates:
+        node = roots[candidate.root_index]
+        is_omitted = candidate.index in omitted
+        for part in candidate.rel_path.split(os.sep)[:-1]:
+            node.total += 1
+            node.omitted += is_omitted
+            node = node.dirs.setdefault(part, TreeNode())
+        node.total += 1
+        node.omitted += is_omitted
+        if is_omitted:
+            node.files.append(candidate.file)
+
+    lines = []
+
+    def render(node, indent):
+        if node.files:
+            names = ", ".join(node.files[:OMITTED_NAMES_PER_DIR])
+            more = len(node.files) - OMITTED_NAMES_PER_DIR
+            lines.append(f"{indent}{names}" + (f" (+{more} more)" if more > 0 else ""))
+        for name, child in sorted(node.dirs.items()):
+            if not child.omitted:
+                continue
+            if child.omitted == child.total:
+                lines.append(f"{indent}{name}/ ({child.omitted} files)")
+            else:
+                lines.append(f"{indent}{name}/")
+                render(child, indent + "  ")
+
+    for path, root in zip(paths, roots):
+        if root.omitted:
+            lines.append(f"{path.rstrip(os.sep) if os.path.isdir(path) else os.path.dirname(path)}{os.sep}")
+            render(root, "  ")
+    if len(lines) > OMITTED_HEADER_MAX_LINES:
+        lines[OMITTED_HEADER_MAX_LINES:] = [f"  ... ({len(lines) - OMITTED_HEADER_MAX_LINES} more lines)"]
+    return lines
+
+
+class BundleBuilder:
+    # Collects file sections as a list of chunks joined once at the end, and stops accepting sections
+    # once the output size budget (in characters, 0 for unlimited) would be exceeded. With a sink (any object
+    # with a write() method) chunks are written out as they come instead, so memory stays bounded by the
+    # read-ahead of read_files() rather than the bundle size; getvalue() is then unavailable.
+    def __init__(self, max_size=0, cache=None, sink=None, on_section=None, on_scan=None, on_plan=None):
+        self.max_size = max_size
+        self.cache = cache
+        self.sink = sink
+        self.on_section = on_section  # called after each file added, or selected by priority; may raise to abort
+        self.on_scan = on_scan  # called while add_paths_by_priority() ranks and reads candidates; may raise to abort
+        self.on_plan = on_plan  # called with the number of files add_paths_by_priority() expects to read
+        self.chunks = []
+        self.size = 0
+        self.files_count = 0
+        self.lines_count = 0
+        self.file_names = []
+        self.truncated = False
+        self.stop_reason = None
+
+    def append(self, text):
+        if self.sink is not None:
+            self.sink.write(text)
+        else:
+            self.chunks.append(text)
+        self.size += len(text)
+
+    def add_section(self, file, file_path, file_content, line_count):
+        header = section_header(file, file_path)
+        if not self.fits(len(header) + len(file_content) + len(SECTION_SEPARATOR)):
+            self.mark_truncated()
+            return False
+        self.append(header)
+        for chunk in iter_content_chunks(file_content):
+            self.append(chunk)
+        self.append(SECTION_SEPARATOR)
+        self.files_count += 1
+        self.lines_count += line_count
+        self.file_names.append(file)
+        return True
+
+    def add_bundle(self, content, files_count, lines_count, file_names):
+        # Prebuilt output for a whole path, e.g. a pinned folder
+        if not self.fits(len(content)):
+            return False
+        self.append(content)
+        self.files_count += files_count
+        self.lines_count += lines_count
+        self.file_names.extend(file_names)
+        return True
+
+    def fits(self, size):
+        return not self.max_size or self.size + size <= self.max_size
+
+    def mark_truncated(self):
+        self.stop(f"Output size limit of {self.max_size / 1024 / 1024:.2f} MB reached.")
+
+    def stop(self, reason):
+        # Ends the bundle early with a note, keeping the sections added so far
+        self.truncated = True
+        self.stop_reason = reason
+        self.append(f"{reason} Remaining files were skipped.\n")
+
+    def add_path(self, path, settings):
+        if self.truncated:
+            return False
+        sections = iter_path_sections(path, settings, self.cache)
+        try:
+            for file, file_path, (file_content, line_count) in sections:
+                if not self.add_section(file, file_path, file_content, line_count):
+                    return False
+                if self.on_section is not None:
+                    self.on_section(file_path)
+        finally:
+            sections.close()  # stops the walk and cancels outstanding reads when the budget is hit
+            if self.cache is not None:
+                self.cache.flush()
+        return True
+
+    def add_path_changes(self, path, settings, previous, current):
+        # Only the files added or modified between two manifests of `path`, after a summary that also names the
+        # deleted ones. Unchanged files are never read.
+        changed = [file_path for file_path, key in current.items() if previous.get(file_path) != key]
+        added = sum(file_path not in previous for file_path in changed)
+        deleted = [file_path for file_path in previous if file_path not in current]
+        top = path if os.path.isdir(path) else os.path.dirname(path)
+        summary = [f"Changes in {path} since the last copy: {len(changed) - added} modified, {added} added, "
+                   f"{len(deleted)} deleted." if changed or deleted else f"No changes in {path} since the last copy."]
+        summary.extend(f"Deleted: {os.path.relpath(file_path, top)}" for file_path in deleted)
+        text = "\n".join(summary) + SECTION_SEPARATOR
+        if not self.fits(len(text)):
+            self.mark_truncated()
+            return False
+        self.append(text)
+
+        candidates = ((os.path.basename(file_path), file_path) for file_path in changed)
+        sections = iter_file_sections(candidates, settings, self.cache)
+        try:
+            for file, file_path, (file_content, line_count) in sections:
+                if not self.add_section(file, file_path, file_content, line_count):
+                    return False
+                if self.on_section is not None:
+                    self.on_section(file_path)
+        finally:
+            sections.close()
+            if self.cache is not None:
+                self.cache.flush()
+        return True
+
+    def add_paths_by_priority(self, paths, settings, budget):
+        # Ranks every candidate file of `paths` and fills `budget` characters (0 for unlimited) with the best ones.
+        # Identical files become a reference to the first copy; only files sharing a size are hashed. The bundle
+        # starts with a tree of what was left out, then the selected files in walk order. A file's byte size
+        # bounds its decoded length, so files that cannot fit are skipped without being read.
+        now = time.time()
+        max_file_size = settings.max_file_size * 1024 * 1024
+        candidates = []
+        for root_index, path in enumerate(paths):
+            top = path if os.path.isdir(path) else os.path.dirname(path)
+            for file, file_path in instrumentation.iterate("walk", iter_candidate_files(path, settings)):
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                rel_path = os.path.relpath(file_path, top)
+                candidates.append(Candidate(len(candidates), root_index, rel_path, file, file_path, stat.st_size,
+                                            score_candidate(rel_path, stat.st_size, stat.st_mtime, now)))
+                if self.on_scan is not None and len(candidates) % SCAN_CHECK_INTERVAL == 0:
+                    self.on_scan()
+
+        by_path = {candidate.file_path: candidate for candidate in candidates}
+        size_counts = Counter(candidate.size for candidate in candidates)
+        remaining = max(budget - PRIORITY_HEADER_RESERVE, budget // 2) if budget else math.inf
+        selected = {}  # walk index -> (content, line_count)
+        copies = {}  # digest -> walk indices of the selected files with that content
+
+        def section_cost(candidate, content):
+            return len(section_header(candidate.file, candidate.file_path)) + len(content) + len(SECTION_SEPARATOR)
+
+        def size_cost(candidate):
+            return len(section_header(candidate.file, candidate.file_path)) + candidate.size + len(SECTION_SEPARATOR)
+
+        ranked = [candidate for candidate in sorted(candidates, key=lambda candidate: -candidate.score)
+                  if candidate.size <= max_file_size]
+        if self.on_plan is not None:
+            planned = 0
+            left = remaining
+            for candidate in ranked:
+                if size_cost(candidate) <= left:
+                    planned += 1
+                    left -= size_cost(candidate)
+            self.on_plan(planned)
+
+        def wanted():
+            for candidate in ranked:
+                if size_cost(candidate) <= remaining:
+                    yield candidate.file, candidate.file_path
+
+        sections = read_files(wanted(), max_file_size, settings.read_workers, self.cache)
+        try:
+            for file, file_path, (file_content, line_count) in sections:
+                if self.on_scan is not None:
+                    self.on_scan()
+                if not line_count:
+                    continue  # binary or unreadable, listed as omitted
+                candidate = by_path[file_path]
+                digest = None
+                indices = [candidate.index]
+                if size_counts[candidate.size] > 1 and not isinstance(file_content, MappedTextFile):
+                    digest = content_digest(file_content)
+                    indices = sorted(copies.get(digest, []) + indices)
+                # Files are written in walk order, so the full copy goes to the first of the identical ones and the
+                # others refer to it, which can move the full copy off a file selected earlier
+                reference = f"Same content as {candidates[indices[0]].file_path}\n"
+                group = {index: (file_content, line_count) if index == indices[0] else (reference, 0)
+                         for index in indices}
+                cost = sum(section_cost(candidates[index], content) for index, (content, _) in group.items())
+                cost -= sum(section_cost(candidates[index], selected[index][0])
+                            for index in indices if index in selected)
+                if cost > remaining:
+                    continue
+                remaining -= cost
+                selected.update(group)
+                if self.on_section is not None:
+                    self.on_section(file_path)
+                if digest is not None:
+                    copies[digest] = indices
+        finally:
+            # Also runs when the job is cancelled or times out, so whatever was selected is still written
+            sections.close()
+            if self.cache is not None:
+                self.cache.flush()
+            omitted = {candidate.index for candidate in candidates if candidate.index not in selected}
+            duplicates = sum(len(indices) - 1 for indices in copies.values())
+            header = [f"Selected {len(selected)} of {len(candidates)} file(s) by priority"
+                      + (f" within a budget of {budget} characters" if budget else "")
+                      + (f"; {duplicates} duplicate(s) replaced by a reference" if duplicates else "") + "."]
+            if omitted:
+                header.append(f"Omitted {len(omitted)} file(s):")
+                header.extend(format_omitted_tree(paths, candidates, omitted))
+            self.append("\n".join(header) + SECTION_SEPARATOR)
+            for index in sorted(selected):
+                candidate = candidates[index]
+                if not self.add_section(candidate.file, candidate.file_path, *selected[index]):
+                    break
+        return not self.truncated
+
+    def getvalue(self):
+        if self.sink is not None:
+            raise ValueError("The bundle was written to a sink")
+        with instrumentation.measure("bundle.join") as measurement:
+            content = "".join(self.chunks)
+            # The joined string replaces the chunks, so the bundle is held once while the caller encodes it
+            self.chunks = [content]
+            measurement.size = len(content)
+        return content
+
+
+def process_path(path, settings, cache=None):
+    builder = BundleBuilder(settings.max_output_size * 1024 * 1024, cache)
+    builder.add_path(path, settings)
+    return builder.getvalue(), builder.files_count, builder.lines_count, builder.file_names
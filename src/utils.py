@@ -1,9 +1,22 @@
 import json
-import mimetypes
 import os
-import requests
+import re
 import time
 from PyQt6.QtWidgets import QApplication
+from Instrumentation import instrumentation
+from LazyMimeData import LazyMimeData
+from processing import CHARS_PER_TOKEN
+
+SECTION_HEADER_PATTERN = re.compile(r'^File: (.*)\nPath: .*\n', re.MULTILINE)
+OLLAMA_URL = 'http://localhost:11434'
+OLLAMA_DEFAULT_NUM_CTX = 2048
+OLLAMA_DISCOVERY_TIMEOUT = 5
+SUMMARY_RESERVED_TOKENS = 256  # instructions and the answer
+SUMMARY_MAX_TOKENS = 64
+SUMMARY_MIN_EXCERPT_CHARS = 200
+LAZY_CLIPBOARD_THRESHOLD = 1024 * 1024  # bundles at least this big are rendered only when pasted
+
+_context_tokens = {}  # model -> context window in tokens
 
 
 def get_clipboard_files():
@@ -14,80 +27,145 @@ def get_clipboard_files():
     return []
 
 
-def is_probably_text_file(file_path):
-    mime_type, _ = mimetypes.guess_type(file_path)
-    return mime_type and mime_type.startswith('text/')
+def get_clipboard_fingerprint():
+    # Cheap identity of the clipboard state: format list plus raw URLs, without touching the filesystem
+    # or pulling large text payloads out of the clipboard.
+    mime_data = QApplication.clipboard().mimeData()
+    if mime_data is None:
+        return None
+    urls = tuple(url.toString() for url in mime_data.urls()) if mime_data.hasUrls() else ()
+    return tuple(mime_data.formats()), urls
 
 
-def get_file_content(file_path, max_file_size):
-    if os.path.getsize(file_path) > max_file_size:
-        return f"File {file_path} is too large (>{max_file_size / 1024 / 1024:.2f} MB). Skipping.\n", 0
+def set_clipboard_content(content):
+    with instrumentation.measure("clipboard.set_text") as measurement:
+        clipboard = QApplication.clipboard()
+        clipboard.setText(content)
+        measurement.size = len(content)
 
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            line_count = content.count('\n') + 1
-            return content, line_count
-    except UnicodeDecodeError:
-        return f"File {file_path} is not a text file or uses an unsupported encoding. Skipping.\n", 0
-    except Exception as e:
-        return f"Error reading file {file_path}: {str(e)}\n", 0
-
-
-def process_path(path, settings):
-    content = ""
-    total_files = 0
-    total_lines = 0
-    file_names = []
-    if os.path.isfile(path):
-        if settings.process_all_files or any(path.endswith(ext) for ext in settings.supported_extensions):
-            file_content, line_count = get_file_content(path, settings.max_file_size * 1024 * 1024)
-            content += f"File: {os.path.basename(path)}\n"
-            content += f"Path: {path}\n"
-            content += file_content
-            content += "\n\n"
-            total_files += 1
-            total_lines += line_count
-            file_names.append(os.path.basename(path))
-    elif os.path.isdir(path):
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if settings.process_all_files or any(file_path.endswith(ext) for ext in settings.supported_extensions):
-                    file_content, line_count = get_file_content(file_path, settings.max_file_size * 1024 * 1024)
-                    content += f"File: {file}\n"
-                    content += f"Path: {file_path}\n"
-                    content += file_content
-                    content += "\n\n"
-                    total_files += 1
-                    total_lines += line_count
-                    file_names.append(file)
-    return content, total_files, total_lines, file_names
 
+def set_clipboard_lazy(render):
+    # GUI thread only: the clipboard calls back into the mime data object when a consumer asks for the text
+    with instrumentation.measure("clipboard.set_lazy"):
+        QApplication.clipboard().setMimeData(LazyMimeData(render))
 
-def set_clipboard_content(content):
-    clipboard = QApplication.clipboard()
-    clipboard.setText(content)
+
+def set_clipboard_history_item(db_manager, item_id):
+    # Large items are loaded and decompressed from history storage only if they are actually pasted
+    size = db_manager.get_history_item_size(item_id)
+    if not size:
+        return False
+    if size < LAZY_CLIPBOARD_THRESHOLD:
+        set_clipboard_content(db_manager.get_history_item_content(item_id))
+    else:
+        set_clipboard_lazy(lambda: db_manager.get_history_item_content(item_id))
+    return True
 
 
 def get_installed_ollama_models():
+    import requests  # deferred: only needed once Ollama is used, and slow to import
+
     try:
-        response = requests.get('http://localhost:11434/api/tags')
+        response = requests.get(f'{OLLAMA_URL}/api/tags', timeout=OLLAMA_DISCOVERY_TIMEOUT)
         response.raise_for_status()
         models = response.json()['models']
         return [model['name'] for model in models]
     except requests.RequestException as e:
         print(f"Error fetching Ollama models: {e}")
-        return []
+        return None
+
 
+def get_ollama_context_tokens(model, session=None):
+    # Context window Ollama will actually use for the model: its num_ctx parameter (Ollama's default when
+    # unset), capped by the context length the model was trained with
+    if model in _context_tokens:
+        return _context_tokens[model]
+    import requests
+
+    http = session or requests
+    context_tokens = OLLAMA_DEFAULT_NUM_CTX
+    try:
+        response = http.post(f'{OLLAMA_URL}/api/show', json={'model': model, 'name': model},
+                             timeout=OLLAMA_DISCOVERY_TIMEOUT)
+        response.raise_for_status()
+        info = response.json()
+        for line in (info.get('parameters') or '').splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[0] == 'num_ctx' and parts[1].isdigit():
+                context_tokens = int(parts[1])
+        for key, value in (info.get('model_info') or {}).items():
+            if key.endswith('.context_length') and isinstance(value, int):
+                context_tokens = min(context_tokens, value)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error fetching context size of {model}, assuming {context_tokens} tokens: {e}")
+        return context_tokens
+    _context_tokens[model] = context_tokens
+    return context_tokens
+
+
+def build_summary_prompt(sample, file_names, context_tokens):
+    # A representative excerpt sized to the context window: the file list, then the head of each file
+    # found in the sample, every file getting an equal share of what is left
+    budget = max(context_tokens - SUMMARY_RESERVED_TOKENS, SUMMARY_RESERVED_TOKENS) * CHARS_PER_TOKEN
+    sections = list(SECTION_HEADER_PATTERN.finditer(sample))
+    if file_names is None:
+        file_names = [section.group(1) for section in sections]
+
+    listing = []
+    listing_size = 0
+    for name in file_names:
+        listing_size += len(name) + 1
+        if listing_size > budget // 4:
+            listing.append(f"... and {len(file_names) - len(listing)} more")
+            break
+        listing.append(name)
+    remaining = budget - listing_size
+
+    if sections:
+        share = max(remaining // len(sections), SUMMARY_MIN_EXCERPT_CHARS)
+        excerpts = []
+        for index, section in enumerate(sections):
+            if remaining <= 0:
+                break
+            end = sections[index + 1].start() if index + 1 < len(sections) else len(sample)
+            head = sample[section.end():min(end, section.end() + min(share, remaining))].strip()
+            excerpts.append(f"File: {section.group(1)}\n{head}")
+            remaining -= len(excerpts[-1]) + 2
+        excerpt = "\n\n".join(excerpts)
+    else:
+        excerpt = sample[:max(remaining, 0)]
+
+    files = f"Files ({len(file_names)}):\n" + "\n".join(listing) + "\n\n" if file_names else ""
+    return (f"Answer a title for the following copied content, just the title, nothing else.\n\n"
+            f"{files}Excerpts:\n{excerpt}\n\n"
+            f"Answer a title for the content above, just the title, nothing else.")
+
+
+def clean_title(text):
+    return ' '.join(text.strip().strip('"\'*#').split()[:50])
+
+
+def summarize_with_ollama(sample, model, max_retries=3, session=None, file_names=None):
+    # sample is the head of the bundle; only the first complete line of the answer is read
+    import requests
+
+    http = session or requests
+    prompt = build_summary_prompt(sample, file_names, get_ollama_context_tokens(model, session))
+    with instrumentation.measure("ollama.summarize") as measurement:
+        measurement.size = len(prompt)
+        return request_title(http, prompt, model, max_retries)
+
+
+def request_title(http, prompt, model, max_retries):
+    import requests
 
-def summarize_with_ollama(content, model, max_retries=3):
-    prompt = f"Answer a title from the following content, just the title, nothing else:\n\n{content}\n\nAnswer a title from the content above, , just the title, nothing else."
     for attempt in range(max_retries):
         try:
-            response = requests.post('http://localhost:11434/api/generate',
-                                     json={'model': model, 'prompt': prompt},
-                                     timeout=30, stream=True)  # Increased timeout to 30 seconds
+            started = time.perf_counter()
+            response = http.post(f'{OLLAMA_URL}/api/generate',
+                                 json={'model': model, 'prompt': prompt,
+                                       'options': {'num_predict': SUMMARY_MAX_TOKENS}},
+                                 timeout=30, stream=True)  # Increased timeout to 30 seconds
             response.raise_for_status()
 
             full_response = ""
@@ -96,15 +174,23 @@ def summarize_with_ollama(content, model, max_retries=3):
                     try:
                         data = json.loads(line)
                         if 'response' in data:
+                            if started is not None:
+                                instrumentation.record("ollama.first_token", time.perf_counter() - started)
+                                started = None
                             full_response += data['response']
+                            answer = full_response.lstrip()
+                            if '\n' in answer:
+                                # The title line is complete; closing the stream stops the generation
+                                response.close()
+                                return clean_title(answer.split('\n', 1)[0]) or "Unable to generate summary"
                         if data.get('done', False):
-                            summary = ' '.join(full_response.strip().split()[:50])
+                            summary = clean_title(full_response)
                             return summary
                     except json.JSONDecodeError as json_err:
                         print(f"Error decoding JSON line: {line}")
                         print(f"Error details: {str(json_err)}")
 
-            summary = ' '.join(full_response.strip().split()[:50])
+            summary = clean_title(full_response)
             return summary if summary else "Unable to generate summary"
 
         except requests.exceptions.RequestException as e:
@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from DatabaseManager import DatabaseManager  # noqa: E402
+from ProcessingJob import ProcessingJob  # noqa: E402
+from Settings import Settings  # noqa: E402
+
+
+class DeltaArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmp.name, "project")
+        os.makedirs(self.folder)
+        with open(os.path.join(self.folder, "notes.txt"), "w") as file:
+            file.write("unchanged\n")
+        self.write_zip("first version\n")
+        self.db_manager = DatabaseManager(os.path.join(self.tmp.name, "test.db"))
+        self.settings = Settings(self.db_manager)
+
+    def tearDown(self):
+        self.db_manager.close()
+        self.tmp.cleanup()
+
+    def write_zip(self, text):
+        with zipfile.ZipFile(os.path.join(self.folder, "a.zip"), "w") as archive:
+            archive.writestr("src/member.txt", text)
+
+    def copy(self):
+        job = ProcessingJob([self.folder], self.settings, db_manager=self.db_manager, delta=True)
+        builder = job.run()
+        item_id = self.db_manager.add_copy_history(builder.files_count, builder.lines_count, builder.getvalue())
+        self.db_manager.set_copy_manifests(item_id, job.manifests)
+        return builder.getvalue()
+
+    def test_changed_archive_is_expanded(self):
+        first = self.copy()
+        self.assertIn("first version", first)
+        self.write_zip("second version, now longer\n")
+
+        delta = self.copy()
+        self.assertIn("1 modified, 0 added, 0 deleted", delta)
+        self.assertIn("second version, now longer", delta)
+        self.assertIn(os.path.join("a.zip", "src", "member.txt"), delta)
+        self.assertNotIn("not a text file", delta)
+        self.assertNotIn("unchanged", delta)
+
+
+if __name__ == "__main__":
+    unittest.main()